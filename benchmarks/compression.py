@@ -0,0 +1,37 @@
+'''
+Bandwidth saved versus CPU spent compressing `UserInfo` responses for a typical and a heavy
+player, at a few levels of each supported coding.
+'''
+import time
+
+from pydantic_core import to_json
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic
+from transcode_tycoon.utils.compression import compress, supported_encodings
+
+from benchmarks.utils import make_user
+
+
+LEVELS = {'gzip': (1, 6, 9), 'zstd': (1, 3, 10)}
+
+
+def main(players: dict[str, int] | None = None, repeats: int = 20) -> None:
+    players = players or {'typical': 100, 'heavy': 10_000}
+    game_logic = TranscodeTycoonGameLogic(disable_backups=True)
+
+    for player, completed_jobs in players.items():
+        body = to_json(make_user(game_logic, completed_jobs))
+        print(f'=== COMPRESSION: {player} player, {completed_jobs} completed jobs, {len(body):,} bytes ===')
+        print(f'{"coding":<10} {"level":>5} {"bytes":>12} {"saved":>8} {"ms/response":>12}')
+        for encoding in supported_encodings():
+            for level in LEVELS[encoding]:
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    compressed = compress(body, encoding, level)
+                elapsed_ms = (time.perf_counter() - start) / repeats * 1000
+                saved = 1 - len(compressed) / len(body)
+                print(f'{encoding:<10} {level:>5} {len(compressed):>12,} {saved:>8.1%} {elapsed_ms:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''
+Measures claim and load throughput with and without pydantic validation.
+
+Claiming compares rebuilding the queued job from a dump (the old path), validating it
+straight from the board job's attributes (the current path), and copying those attributes
+into `JobInfoQueued.model_construct`. `model_construct` walks the fields in Python, which
+makes it slower than letting pydantic-core validate a job this small.
+
+Loading compares the validated path `UserStore` uses for persisted users against a
+hand-written `model_construct` tree, and against `model_validate_json` on each user's raw
+JSON. `model_construct` can't coerce strings back into datetimes and enums on its own, so
+the trusted path has to do that in Python, which costs more than letting pydantic-core
+validate the whole user.
+
+`model_validate` alone doesn't tell the whole story: the current path also pays for the
+`json.loads` of the shard, which `model_validate_json` folds in. Counting it,
+`model_validate_json` is the fastest way to load a user, by 20-30% here. It isn't used
+because it needs each user's raw JSON, while shard snapshots are a single JSON object that
+is parsed whole, and the raw dicts are also what pending users are ranked and checked for
+idleness from.
+'''
+import json
+from datetime import datetime
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic
+from transcode_tycoon.models.computer import ComputerInfo, HardwareStats, HardwareType
+from transcode_tycoon.models.jobs import Format, JobInfo, JobInfoQueued, JobStatus, Priority
+from transcode_tycoon.models.users import UserInfo
+
+from benchmarks.utils import build_state, timer
+
+
+def construct_job(job_data: dict) -> JobInfoQueued:
+    return JobInfoQueued.model_construct(
+        job_id=job_data['job_id'],
+        status=JobStatus(job_data['status']),
+        priority=Priority(job_data['priority']),
+        total_run_time=job_data['total_run_time'],
+        format=Format(job_data['format']),
+        estimated_completion_ts=datetime.fromisoformat(job_data['estimated_completion_ts']),
+        render_time_seconds=job_data['render_time_seconds'],
+    )
+
+
+def construct_user(user_data: dict) -> UserInfo:
+    hardware = {
+        HardwareType(hardware_type): HardwareStats.model_construct(**hardware_stat)
+        for hardware_type, hardware_stat in user_data['computer']['hardware'].items()
+    }
+    return UserInfo.model_construct(
+        user_id=user_data['user_id'],
+        username=user_data['username'],
+        funds=user_data['funds'],
+        completed_jobs=[construct_job(j) for j in user_data['completed_jobs']],
+        job_queue=[construct_job(j) for j in user_data['job_queue']],
+        computer=ComputerInfo.model_construct(hardware=hardware),
+    )
+
+
+def bench_claims(claims: int) -> None:
+    print(f'=== CLAIMS: {claims} jobs ===')
+    game_logic = TranscodeTycoonGameLogic(disable_backups=True)
+    jobs = [game_logic.generate_random_job() for _ in range(claims)]
+    completion_ts = datetime.now()
+
+    with timer('validated rebuild from model_dump'):
+        for job in jobs:
+            JobInfoQueued(**job.model_dump(), estimated_completion_ts=completion_ts, render_time_seconds=60.0)
+    with timer('validated from board job (current)'):
+        for job in jobs:
+            JobInfoQueued(
+                **{field: getattr(job, field) for field in JobInfo.model_fields},
+                estimated_completion_ts=completion_ts,
+                render_time_seconds=60.0,
+            )
+    with timer('model_construct from board job'):
+        for job in jobs:
+            JobInfoQueued.model_construct(
+                **{field: getattr(job, field) for field in JobInfo.model_fields},
+                estimated_completion_ts=completion_ts,
+                render_time_seconds=60.0,
+            )
+
+
+def bench_loads(users: int, completed_jobs: int) -> None:
+    print(f'=== LOADS: {users} users with {completed_jobs} completed jobs each ===')
+    state = build_state(users, completed_jobs)
+    raw_users = {user_id: json.dumps(user_data) for user_id, user_data in state.items()}
+
+    with timer('model_validate (current)'):
+        for user_data in state.values():
+            UserInfo.model_validate(user_data)
+    with timer('json.loads + model_validate (current)'):
+        for raw_user in raw_users.values():
+            UserInfo.model_validate(json.loads(raw_user))
+    with timer('model_construct'):
+        for user_data in state.values():
+            construct_user(user_data)
+    with timer('model_validate_json'):
+        for raw_user in raw_users.values():
+            UserInfo.model_validate_json(raw_user)
+
+
+def main(claims: int = 50_000, users: int = 300, completed_jobs: int = 200) -> None:
+    bench_claims(claims)
+    bench_loads(users, completed_jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+Measures how long it takes to recover the persisted state after a restart at large state
+sizes: with every newest snapshot intact, and after a crash has torn the newest snapshot of
+every shard so recovery has to fall back to the previous version. The old full reparse of a
+single `tycoon_state.json` is included for reference.
+
+Also measures per-request latency at that state size: requests that only mark their shard
+dirty for the background flush, against the old behaviour of writing a snapshot of the
+shard on every request, and what the background flush then costs, both in total and on
+the event loop.
+'''
+import asyncio
+import gc
+import json
+import tempfile
+import time
+from glob import glob
+from os import path
+
+import numpy as np
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic
+
+from benchmarks.utils import build_state, timer
+
+
+def tear_newest_snapshots(shard_dir: str) -> None:
+    newest: dict[str, str] = {}
+    for snapshot_file in sorted(glob(path.join(shard_dir, 'shard-*.snapshot'))):
+        newest[path.basename(snapshot_file).split('.')[0]] = snapshot_file
+    for snapshot_file in newest.values():
+        with open(snapshot_file, 'r+b') as torn_file:
+            torn_file.truncate(path.getsize(snapshot_file) // 2)
+
+
+def time_requests(label: str, game_logic: TranscodeTycoonGameLogic, user_ids: list[str], claim: bool, dump_each: bool) -> None:
+    '''
+    Looks each user up the way an authenticated request does and either just reads them or
+    claims a job. With `dump_each` every request also writes its shard, as it used to.
+    '''
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        user_info = game_logic.get_user(user_id)
+        if claim:
+            game_logic.claim_job(next(iter(game_logic.jobs)), user_info)
+        if dump_each:
+            # reads used to dirty the shard too, and every user in it was serialized again
+            game_logic.users.mark_dirty(user_id)
+            game_logic.users._persisted.clear()
+            game_logic.__dump_state__()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if claim:
+            user_info.job_queue.clear()
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f'{label:<48} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms')
+
+
+def main(sizes: tuple[int, ...] = (5_000, 20_000), completed_jobs: int = 50) -> None:
+    for users in sizes:
+        print(f'=== RECOVERY: {users} users x {completed_jobs} completed jobs ===')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_file = path.join(tmp_dir, 'tycoon_state.json')
+            with open(state_file, 'w') as json_file:
+                json.dump(build_state(users, completed_jobs), json_file)
+            print(f'state size: {path.getsize(state_file) / 1_000_000:.1f} MB')
+
+            with timer('full reparse of a single state file'):
+                with open(state_file, 'r') as json_file:
+                    json.load(json_file)
+
+            game_logic = TranscodeTycoonGameLogic(state_dir=tmp_dir)
+            with timer('migrate into checksummed snapshots'):
+                game_logic.users.load()
+            game_logic.users.mark_all_dirty()
+            with timer('dump every shard (write, fsync, rename)'):
+                game_logic.__dump_state__()
+            shard_dir = game_logic.shard_dir
+            # drop the writer's copy of the state so it doesn't slow the recoveries down
+            del game_logic
+            gc.collect()
+
+            with timer('recover: newest snapshots intact'):
+                TranscodeTycoonGameLogic(state_dir=tmp_dir).users.load()
+
+            tear_newest_snapshots(shard_dir)
+            with timer('recover: newest snapshots torn'):
+                game_logic = TranscodeTycoonGameLogic(state_dir=tmp_dir, job_board_capacity=1_000)
+                game_logic.users.load()
+
+            game_logic.users.materialize()
+            game_logic.refill_job_board()
+            user_ids = list(game_logic.users)[:50]
+            for claim in (False, True):
+                request = 'claim' if claim else 'read'
+                time_requests(f'{request}: write snapshot per request (old)', game_logic, user_ids, claim, dump_each=True)
+                time_requests(f'{request}: mark dirty for the next flush', game_logic, user_ids, claim, dump_each=False)
+                # the part of a flush that blocks the event loop
+                with timer(f'{request}: serialize the dirty shards'):
+                    dirty_shards = game_logic.users.dump_dirty_shards()
+                game_logic.users.mark_unsaved(dirty_shards, None, [])
+                with timer(f'{request}: background flush of those requests'):
+                    asyncio.run(game_logic.flush_state())
+
+
+if __name__ == '__main__':
+    main()
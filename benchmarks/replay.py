@@ -0,0 +1,61 @@
+'''
+Replays a request trace recorded with `TRANSCODE_TYCOON_TRACE_FILE` against a fresh
+`TranscodeTycoonGameLogic` with a seeded job generator, and reports latency per route.
+
+    python -m benchmarks.replay trace.jsonl
+    python -m benchmarks.replay trace.jsonl --speed 1
+
+Without `--speed` requests are sent back to back; with it they're paced in wall time at that
+multiple of the original speed. State is persisted to a temporary directory by a flush every
+`flush_interval` seconds of trace time, which is timed separately from the requests. The
+replay itself lives in `transcode_tycoon.utils.replay`.
+'''
+import argparse
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from transcode_tycoon.utils.replay import TraceReplay, read_trace
+
+
+def report(latencies: dict[str, list[float]], errors: dict[str, int], recorded: dict[str, list[float]]) -> None:
+    print(f'{"route":<34} {"count":>7} {"errors":>7} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"max ms":>8} {"rec p50":>8}')
+    for route, samples in sorted(latencies.items()):
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        recorded_p50 = np.percentile(recorded[route], 50) if recorded[route] else float('nan')
+        print(
+            f'{route:<34} {len(samples):>7} {errors[route]:>7} {p50:>8.3f} {p90:>8.3f} '
+            f'{p99:>8.3f} {max(samples):>8.3f} {recorded_p50:>8.3f}'
+        )
+
+
+def main(trace_file: str, speed: float | None = None, seed: int = 0) -> None:
+    records = read_trace(trace_file)
+    recorded: dict[str, list[float]] = defaultdict(list)
+    for record in records:
+        recorded[f'{record["method"]} {record["route"]}'].append(record['duration_ms'])
+
+    pace = f'{speed}x original speed' if speed else 'back to back'
+    print(f'=== REPLAY: {len(records)} requests from {trace_file}, {pace}, seed {seed} ===')
+    with tempfile.TemporaryDirectory() as state_dir:
+        replay = TraceReplay(state_dir, seed=seed)
+        start = time.perf_counter()
+        latencies = replay.replay(records, speed=speed)
+        elapsed = time.perf_counter() - start
+    replayed = sum(len(samples) for samples in latencies.values())
+    print(f'replayed {replayed} requests in {elapsed:.2f}s, skipped {replay.skipped}')
+    # flushes run in the background in the API, off the request path
+    print(f'state flushes: {len(replay.flushes)}, {sum(replay.flushes):.1f} ms in total')
+    # rec p50 is the latency recorded in the trace, which also covers routing and the network stack
+    report(latencies, replay.errors, recorded)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded Transcode Tycoon request trace.')
+    parser.add_argument('trace_file', help='JSONL trace written with TRANSCODE_TYCOON_TRACE_FILE set')
+    parser.add_argument('--speed', type=float, default=None, help='Multiple of the original pacing. Back to back if unset')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the job generator and replay choices')
+    args = parser.parse_args()
+    main(args.trace_file, speed=args.speed, seed=args.seed)
@@ -0,0 +1,39 @@
+'''
+Compares serving a large `UserInfo` through FastAPI's default response-model path
+(dump, re-validate, encode) against returning a `PydanticJSONResponse` directly.
+'''
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic
+from transcode_tycoon.models.users import UserInfo
+from transcode_tycoon.utils.responses import PydanticJSONResponse
+
+from benchmarks.utils import make_user, timer
+
+
+def main(completed_jobs: tuple[int, ...] = (10, 1_000, 10_000), requests: int = 50) -> None:
+    game_logic = TranscodeTycoonGameLogic(disable_backups=True)
+    app = FastAPI()
+    client = TestClient(app)
+    users = {n: make_user(game_logic, n) for n in completed_jobs}
+
+    @app.get('/default/{n}')
+    async def default_response(n: int) -> UserInfo:
+        return users[n]
+
+    @app.get('/fast/{n}', response_model=UserInfo)
+    async def fast_response(n: int) -> PydanticJSONResponse:
+        return PydanticJSONResponse(users[n])
+
+    for n in completed_jobs:
+        print(f'=== SERIALIZATION: user with {n} completed jobs, {requests} requests ===')
+        assert client.get(f'/default/{n}').json() == client.get(f'/fast/{n}').json()
+        for route in ('default', 'fast'):
+            with timer(f'{route} response'):
+                for _ in range(requests):
+                    client.get(f'/{route}/{n}')
+
+
+if __name__ == '__main__':
+    main()
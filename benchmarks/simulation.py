@@ -0,0 +1,47 @@
+'''
+Plays simulated days of gameplay against the game logic on a `VirtualClock`, so
+capacity numbers don't require waiting for renders in real time.
+'''
+import time
+from datetime import timedelta
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic, InsufficientResources, ItemNotFoundError
+from transcode_tycoon.models.computer import HardwareType, MaxUpgradesReached
+from transcode_tycoon.utils.clock import VirtualClock
+
+
+def main(players: int = 200, days: float = 1.0, tick: timedelta = timedelta(minutes=1)) -> None:
+    clock = VirtualClock()
+    game_logic = TranscodeTycoonGameLogic(disable_backups=True, job_board_capacity=players * 2, clock=clock)
+    users = [game_logic.create_user().user_info for _ in range(players)]
+    ticks = int(timedelta(days=days) / tick)
+
+    print(f'=== SIMULATION: {players} players x {days} days in {ticks} ticks of {tick} ===')
+    claims = 0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        game_logic.refill_job_board()
+        for user_info in users:
+            game_logic.check_user_jobs(user_info)
+            for upgrade_type in (HardwareType.CPU_CORES, HardwareType.RAM):
+                try:
+                    game_logic.purchase_upgrade(user_info, upgrade_type, levels=None)
+                except (InsufficientResources, MaxUpgradesReached):
+                    pass
+            while len(user_info.job_queue) < user_info.computer.hardware[HardwareType.RAM].value and game_logic.jobs:
+                try:
+                    game_logic.claim_job(next(iter(game_logic.jobs)), user_info)
+                    claims += 1
+                except ItemNotFoundError:
+                    break
+        clock.advance(tick)
+    elapsed = time.perf_counter() - start
+
+    completed = sum(len(u.completed_jobs) for u in users)
+    print(f'simulated {days} days in {elapsed:.2f}s ({timedelta(days=days).total_seconds() / elapsed:,.0f}x real time)')
+    print(f'claims: {claims} | completed renders: {completed} | claims per second: {claims / elapsed:,.0f}')
+    print(f'top revenue: ${max(u.total_revenue for u in users):,.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Compares how long the API takes to become ready with a large `tycoon_state.json`:
+eagerly validating every user (the old behaviour) versus reading the raw state and
+validating users on demand, along with the cost of persisting every shard versus
+only the dirty ones.
+
+Also compares parsing the shard snapshots one after the other against spreading them
+over worker threads and processes, which is why recovery reads them serially.
+'''
+import gc
+import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from os import path
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic
+from transcode_tycoon.models.users import UserInfo
+from transcode_tycoon.utils.snapshots import read_snapshot
+
+from benchmarks.utils import build_state, timer
+
+
+def main(users: int = 5_000, completed_jobs: int = 50) -> None:
+    print(f'=== STARTUP: {users} users x {completed_jobs} completed jobs ===')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state_file = path.join(tmp_dir, 'tycoon_state.json')
+        with open(state_file, 'w') as json_file:
+            json.dump(build_state(users, completed_jobs), json_file)
+        print(f'state file size: {path.getsize(state_file) / 1_000_000:.1f} MB')
+
+        with timer('eager load + validate (old behaviour)'):
+            with open(state_file, 'r') as json_file:
+                {k: UserInfo.model_validate(v) for k, v in json.load(json_file).items()}
+
+        with timer('migrate single file into shards'):
+            TranscodeTycoonGameLogic(state_dir=tmp_dir).users.load()
+
+        with timer('construct game logic'):
+            game_logic = TranscodeTycoonGameLogic(state_dir=tmp_dir)
+
+        with timer('ready: read raw state shards'):
+            game_logic.users.load()
+
+        first_user = next(iter(game_logic.users))
+        with timer('first user lookup'):
+            game_logic.users[first_user]
+
+        with timer('background materialize of remaining users'):
+            game_logic.users.materialize()
+
+        game_logic.users.mark_all_dirty()
+        with timer('dump every shard'):
+            game_logic.__dump_state__()
+
+        game_logic.users.mark_dirty(first_user)
+        with timer('dump a single dirty shard'):
+            game_logic.__dump_state__()
+
+        shard_files = list(game_logic._current_snapshots.values())
+        # drop the loaded users and each parse result so garbage collection doesn't skew the timings
+        del game_logic
+        gc.collect()
+        with timer('parse shards serially'):
+            [read_snapshot(shard_file) for shard_file in shard_files]
+        gc.collect()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            with timer('parse shards on 8 threads'):
+                list(executor.map(read_snapshot, shard_files))
+        gc.collect()
+        with ProcessPoolExecutor(max_workers=8) as executor:
+            with timer('parse shards on 8 processes'):
+                list(executor.map(read_snapshot, shard_files))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Shared helpers for the benchmark scripts. Run any benchmark from the repository root, e.g.
+
+    python -m benchmarks.startup
+'''
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic
+from transcode_tycoon.models.jobs import JobInfoQueued, JobStatus
+from transcode_tycoon.models.users import UserInfo
+
+
+@contextmanager
+def timer(label: str):
+    start = time.perf_counter()
+    yield
+    print(f'{label:<48} {time.perf_counter() - start:10.4f}s')
+
+
+def make_user(game_logic: TranscodeTycoonGameLogic, completed_jobs: int) -> UserInfo:
+    '''
+    Registers a user and backfills their history with `completed_jobs` finished renders.
+    '''
+    user_info = game_logic.create_user().user_info
+    finished_ts = datetime.now() - timedelta(days=1)
+    for _ in range(completed_jobs):
+        job = game_logic.generate_random_job()
+        user_info.completed_jobs.append(JobInfoQueued(
+            **job.model_dump(exclude={'status'}),
+            status=JobStatus.COMPLETED,
+            estimated_completion_ts=finished_ts,
+            render_time_seconds=60.0,
+        ))
+    return user_info
+
+
+def build_state(users: int, completed_jobs: int) -> dict[str, dict]:
+    '''
+    Persisted-state payload for `users` players with `completed_jobs` finished renders each.
+    '''
+    game_logic = TranscodeTycoonGameLogic(disable_backups=True)
+    for _ in range(users):
+        make_user(game_logic, completed_jobs)
+    return game_logic.users.dump()
@@ -1,15 +1,19 @@
-import requests
+import asyncio
+
+from transcode_tycoon.client import TranscodeTycoonClient
 
 url = 'http://localhost:8000'
 
-headers = {
-    'Authorization': 'Bearer TOKEN_GOES_HERE'
-}
 
-# create a user
-r = requests.post(f'{url}/register')
-headers['Authorization'] = f'Bearer {r.json()["token"]}'
+async def main() -> None:
+    # one pooled keep-alive connection is reused for every request
+    async with TranscodeTycoonClient(url) as client:
+        # create a user. pass token='TOKEN_GOES_HERE' to the client to reuse an existing one
+        created_user = await client.register()
+        print(f'token: {created_user.token}')
+
+        # get that user's information
+        print(await client.my_info())
+
 
-# get that user's information
-r = requests.get(f'{url}/users/my_info', headers=headers)
-print(r.json())
+asyncio.run(main())
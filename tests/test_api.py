@@ -1,7 +1,17 @@
+import json
+import os
+
 from transcode_tycoon.__main__ import app
 from transcode_tycoon.game_logic import game_logic
 from transcode_tycoon.models.computer import HardwareType
-
+from transcode_tycoon.utils.rate_limit import RateLimit
+from transcode_tycoon.utils import compression
+from transcode_tycoon.utils.compression import select_encoding
+from transcode_tycoon.utils.tracing import TraceRecorderMiddleware
+from transcode_tycoon.utils.replay import TraceReplay, read_trace
+
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 
@@ -36,6 +46,13 @@ def test_api_functions():
         [x['upgrade_price'] for x in user_info_base.json()['computer']['hardware'].values()]
     ) + game_logic.starter_gpu().upgrade_price
 
+    # everyone starts with empty stats at every resolution
+    stats_response = client.get('/users/my_stats', headers=headers)
+    assert stats_response.status_code == 200
+    assert [s['resolution'] for s in stats_response.json()['series']] == ['minute', 'hour', 'day']
+    hourly_response = client.get('/users/my_stats', headers=headers, params={'resolution': 'hour'})
+    assert [len(s['buckets']) for s in hourly_response.json()['series']] == [48]
+
     # register another user and make sure the user id and token are different
     new_user_2 = client.post('/register').json()
     assert new_user_2['token'] != register_response['token']
@@ -73,12 +90,24 @@ def test_api_functions():
     search_response = client.get(f'/users/search/{user_id}')
     assert user_id == search_response.json()['user_id']
 
+    # users can be found by a username prefix
+    prefix_response = client.get('/users/search', params={'username_prefix': 'TEST_user'})
+    assert prefix_response.status_code == 200
+    assert user_id in [u['user_id'] for u in prefix_response.json()['users']]
+    assert client.get('/users/search', params={'username_prefix': ''}).status_code == 422
+
     # searching for a nonsense user should return not found
     search_response = client.get(f'/users/search/asdfasdf')
     assert search_response.status_code == 404
 
     ### UPGRADES ###
 
+    # listing upgrades shows the starter GPU without installing it
+    list_response = client.get('/upgrades/list', headers=headers)
+    assert list_response.status_code == 200
+    assert HardwareType.GPU in list_response.json()
+    assert HardwareType.GPU not in client.get('/users/my_info', headers=headers).json()['computer']['hardware']
+
     for upgrade_type in HardwareType:
         # users should have enough starting funds to buy one of each upgrade
         upgrade_response = client.post(
@@ -95,6 +124,16 @@ def test_api_functions():
     )
     assert unauth_upgrade_response.status_code == 403
 
+    # price projections don't buy anything
+    prices_response = client.get(
+        '/upgrades/prices',
+        params={'upgrade_type': HardwareType.CPU_CORES, 'levels': 3},
+        headers=headers
+    )
+    assert prices_response.status_code == 200
+    assert len(prices_response.json()['level_prices']) == 3
+    assert prices_response.json()['max_affordable_levels'] == 0
+
     # the user should not have enough money now for this next upgrade request
     unauth_upgrade_response = client.post(
         '/upgrades/purchase',
@@ -105,8 +144,18 @@ def test_api_functions():
 
     ### JOBS ###
 
+    # the job board is filled by a background task that only runs with the app's lifespan
+    game_logic.refill_job_board()
+
     # get a list of available jobs
-    available_jobs = client.get('/jobs/').json()[-1]
+    job_board_response = client.get('/jobs/')
+    available_jobs = job_board_response.json()[-1]
+
+    # polling an unchanged job board should not resend it
+    etag = job_board_response.headers['ETag']
+    unchanged_response = client.get('/jobs/', headers={'If-None-Match': etag})
+    assert unchanged_response.status_code == 304
+    assert unchanged_response.content == b''
 
     # attempting to claim a job without header should throw unauth error
     claim_response_no_auth = client.post(
@@ -123,6 +172,12 @@ def test_api_functions():
     )
     assert claim_response.status_code == 202
 
+    # claiming a job changes the job board so the old ETag is stale
+    changed_response = client.get('/jobs/', headers={'If-None-Match': etag})
+    assert changed_response.status_code == 200
+    assert changed_response.headers['ETag'] != etag
+    assert available_jobs['job_id'] not in [j['job_id'] for j in changed_response.json()]
+
     # attempt to claim the same job_id again should not found error
     claim_response = client.post(
         '/jobs/claim',
@@ -167,4 +222,120 @@ def test_api_functions():
         headers=headers
     )
     assert len(user_queued_response.json()['job_queue']) == 0
-    
\ No newline at end of file
+
+
+def test_rate_limit():
+    rate_limit = RateLimit(requests_per_second=1.0, burst=2, max_clients=2)
+
+    # the burst is allowed, the next request has to wait for a refill
+    rate_limit.check('client_a')
+    rate_limit.check('client_a')
+    with pytest.raises(HTTPException) as exc_info:
+        rate_limit.check('client_a')
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers['Retry-After'] == '1'
+
+    # other clients have their own buckets and the table never grows past max_clients
+    rate_limit.check('client_b')
+    rate_limit.check('client_c')
+    assert list(rate_limit.buckets) == ['client_b', 'client_c']
+
+    # the leaderboard budget is enforced per client IP
+    leaderboard_statuses = [client.get('/users/leaderboard').status_code for _ in range(10)]
+    assert 429 in leaderboard_statuses
+    limited_response = client.get('/users/leaderboard')
+    assert limited_response.status_code == 429
+    assert 'Retry-After' in limited_response.headers
+
+
+def test_admin_export(monkeypatch):
+    # admin routes don't exist until an admin token is configured
+    monkeypatch.delenv('TRANSCODE_TYCOON_ADMIN_TOKEN', raising=False)
+    assert client.get('/admin/export', headers={'Authorization': 'Bearer anything'}).status_code == 404
+
+    monkeypatch.setenv('TRANSCODE_TYCOON_ADMIN_TOKEN', 'admin-secret')
+    assert client.get('/admin/export', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    # exports stream from persisted state, which the tests run without
+    assert client.get('/admin/export', headers={'Authorization': 'Bearer admin-secret'}).status_code == 409
+
+
+def test_compression(monkeypatch):
+    # clients pick the coding, q=0 rules one out and ties go to the server's preference
+    assert select_encoding('gzip, deflate', ['zstd', 'gzip']) == 'gzip'
+    assert select_encoding('gzip;q=0.5, zstd', ['zstd', 'gzip']) == 'zstd'
+    assert select_encoding('*, zstd;q=0', ['zstd', 'gzip']) == 'gzip'
+    assert select_encoding('identity', ['zstd', 'gzip']) is None
+
+    game_logic.refill_job_board()
+    compressed = client.get('/jobs/', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert int(compressed.headers['Content-Length']) < len(compressed.content)
+
+    uncompressed = client.get('/jobs/', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in uncompressed.headers
+    assert uncompressed.headers['Vary'] == 'Accept-Encoding'
+    assert uncompressed.json() == compressed.json()
+
+    # zstd is preferred when a client accepts both
+    zstd_compressed = client.get('/jobs/', headers={'Accept-Encoding': 'gzip, zstd'})
+    assert zstd_compressed.headers['Content-Encoding'] == 'zstd'
+    assert int(zstd_compressed.headers['Content-Length']) < len(zstd_compressed.content)
+    assert zstd_compressed.json() == uncompressed.json()
+
+    # an unchanged board is only compressed once per coding
+    compress_calls = []
+    compress = compression.compress
+    monkeypatch.setattr(compression, 'compress', lambda *args: compress_calls.append(args[1]) or compress(*args))
+    for _ in range(3):
+        assert client.get('/jobs/', headers={'Accept-Encoding': 'gzip'}).json() == uncompressed.json()
+    assert compress_calls == []
+    game_logic.add_job(game_logic.generate_random_job())
+    changed_board = [client.get('/jobs/', headers={'Accept-Encoding': 'gzip'}) for _ in range(3)]
+    assert compress_calls == ['gzip']
+    assert len(changed_board[-1].json()) == len(uncompressed.json()) + 1
+
+    # small responses aren't worth compressing
+    assert 'Content-Encoding' not in client.get('/', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_trace_replay(tmp_path):
+    trace_file = str(tmp_path / 'trace.jsonl')
+    traced_client = TestClient(TraceRecorderMiddleware(app, trace_file=trace_file))
+
+    token = traced_client.post('/register').json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    game_logic.refill_job_board()
+    job_id = next(iter(game_logic.jobs))
+    traced_client.post('/jobs/claim', headers=headers, params={'job_id': job_id})
+    traced_client.get('/users/my_info', headers=headers)
+    traced_client.get('/upgrades/prices', headers=headers, params={'upgrade_type': 'RAM', 'levels': 2})
+    traced_client.get('/users/my_stats', headers=headers, params=[('resolution', 'minute'), ('resolution', 'hour')])
+    traced_client.get('/users/my_info')
+
+    records = read_trace(trace_file)
+    assert [r['route'] for r in records] == ['/register', '/jobs/claim', '/users/my_info', '/upgrades/prices', '/users/my_stats', '/users/my_info']
+    # tokens and job IDs never make it into the trace
+    assert token not in open(trace_file).read() and job_id not in open(trace_file).read()
+    assert records[1]['user'] == records[2]['user'] == 'user-1'
+    assert records[1]['params'] == {'job_id': [None]}
+    assert records[3]['params'] == {'upgrade_type': ['RAM'], 'levels': ['2']}
+    # repeated parameters keep every value
+    assert records[4]['params'] == {'resolution': ['minute', 'hour']}
+
+    # records are written as requests finish, and read back in the order they started
+    with open(trace_file, 'a') as trace:
+        trace.write(json.dumps({**records[0], 't': records[0]['t'] - 1, 'route': '/'}) + '\n')
+    assert read_trace(trace_file)[0]['route'] == '/'
+    records = read_trace(trace_file)[1:]
+
+    # the same seed replays the same game
+    replays = [TraceReplay(str(tmp_path / f'replay-{i}'), seed=7) for i in range(2)]
+    latencies = [replay.replay(records) for replay in replays]
+    assert sorted(latencies[0]) == ['GET /upgrades/prices', 'GET /users/my_info', 'GET /users/my_stats', 'POST /jobs/claim', 'POST /register']
+    assert replays[0].skipped == 1
+    assert replays[0].game_logic.get_job_board_json() == replays[1].game_logic.get_job_board_json()
+    replayed_users = [replay.game_logic.get_user_by_token(replay.tokens['user-1']) for replay in replays]
+    assert replayed_users[0].job_queue[0].job_id == replayed_users[1].job_queue[0].job_id
+    # the replayed game is persisted like the real one
+    assert os.listdir(replays[0].game_logic.shard_dir)
@@ -0,0 +1,68 @@
+import asyncio
+
+from transcode_tycoon.__main__ import app
+from transcode_tycoon.client import TranscodeTycoonClient, TranscodeTycoonAPIError, run_bot
+from transcode_tycoon.game_logic import game_logic
+from transcode_tycoon.models.computer import HardwareType
+from transcode_tycoon.models.stats import StatsResolution
+
+import httpx
+import pytest
+
+
+game_logic.disable_backups = True
+
+
+def make_client(**kwargs) -> TranscodeTycoonClient:
+    return TranscodeTycoonClient('http://testserver', transport=httpx.ASGITransport(app=app), **kwargs)
+
+
+def test_client_functions():
+    async def client_functions():
+        async with make_client(backoff_seconds=0.01) as client:
+            created_user = await client.register()
+            assert client.token == created_user.token
+
+            user_info = await client.my_info()
+            assert user_info.user_id == created_user.user_info.user_id
+            assert [s.resolution for s in (await client.my_stats()).series] == list(StatsResolution)
+            assert [s.resolution for s in (await client.my_stats([StatsResolution.HOUR])).series] == [StatsResolution.HOUR]
+            assert (await client.update_username('client_user')).username == 'client_user'
+            assert (await client.search_user(user_info.user_id)).username == 'client_user'
+            search_results = await client.search_usernames('CLIENT_', items=100)
+            assert user_info.user_id in [u.user_id for u in search_results.users]
+
+            game_logic.refill_job_board()
+            jobs = await client.list_jobs()
+            assert len(jobs) > 0
+            # an unchanged job board is served from the local copy
+            assert [j.job_id for j in await client.list_jobs()] == [j.job_id for j in jobs]
+
+            # losing a claim race falls through to the next candidate
+            game_logic.jobs.pop(jobs[0].job_id)
+            game_logic.jobs_version += 1
+            user_info = await client.claim_any([jobs[0].job_id, jobs[1].job_id])
+            assert [j.job_id for j in user_info.job_queue] == [jobs[1].job_id]
+
+            claims = await client.claim_jobs([jobs[2].job_id, jobs[3].job_id])
+            assert sum(isinstance(c, TranscodeTycoonAPIError) for c in claims) == 1
+
+            with pytest.raises(TranscodeTycoonAPIError) as exc_info:
+                await client.purchase_upgrade(HardwareType.CPU_CORES)
+            assert exc_info.value.status_code == 402
+
+            projection = await client.upgrade_prices(HardwareType.GPU, levels=2)
+            assert projection.max_affordable_levels == 0
+            assert HardwareType.GPU in await client.list_upgrades()
+
+    asyncio.run(client_functions())
+
+
+def test_reference_bot():
+    async def reference_bot():
+        game_logic.refill_job_board()
+        async with make_client() as client:
+            user_info = await run_bot(client, max_rounds=1)
+            assert len(user_info.job_queue) == user_info.computer.hardware[HardwareType.RAM].value
+
+    asyncio.run(reference_bot())
@@ -1,9 +1,16 @@
+import asyncio
+import json
+import os
+import time
 import pytest
 from datetime import datetime, timedelta
 
-from transcode_tycoon.game_logic import TranscodeTycoonGameLogic, InsufficientResources
-from transcode_tycoon.models.computer import HardwareType
-from transcode_tycoon.models.users import PatchUserInfo
+from transcode_tycoon.game_logic import TranscodeTycoonGameLogic, InsufficientResources, PersistenceDisabledError
+from transcode_tycoon.models.computer import HardwareType, MaxUpgradesReached
+from transcode_tycoon.models.jobs import Format
+from transcode_tycoon.models.users import PatchUserInfo, UserInfo
+from transcode_tycoon.models.stats import StatsResolution
+from transcode_tycoon.utils.clock import Clock, VirtualClock
 
 
 ### CORE FUNCTIONS ###
@@ -19,7 +26,7 @@ def test_game_logic():
     assert len(game_logic_core.users) == 1
     print(f'Successfully created user')
 
-    game_logic_core.create_new_jobs()
+    game_logic_core.refill_job_board()
     assert len(game_logic_core.jobs) == game_logic_core.job_capacity
     print(f'Successfully created job board with capacity: {game_logic_core.job_capacity}')
 
@@ -75,6 +82,91 @@ def test_upgrades():
     print('=== UPGRADES TESTS PASSED ===')
 
 
+def test_bulk_upgrades():
+    print('=== TESTING BULK UPGRADES ===')
+
+    game_logic_upgrades = TranscodeTycoonGameLogic(disable_backups=True)
+    test_upgrade_user = game_logic_upgrades.create_user().user_info
+    cpu = test_upgrade_user.computer.hardware[HardwareType.CPU_CORES]
+
+    # the closed form price matches buying one level at a time
+    single_levels = cpu.model_copy()
+    one_at_a_time = 0.0
+    for levels in range(1, cpu.remaining_levels + 1):
+        one_at_a_time += single_levels.upgrade_price
+        single_levels.upgrade()
+        assert cpu.price_of_levels(levels) == round(one_at_a_time, 2)
+        assert round(sum(cpu.level_prices(levels)), 2) == cpu.price_of_levels(levels)
+
+    test_upgrade_user.funds = cpu.price_of_levels(5)
+    game_logic_upgrades.purchase_upgrade(test_upgrade_user, HardwareType.CPU_CORES, levels=5)
+    assert cpu.current_level == 6
+    assert cpu.value == 2.0 + 5 * cpu.upgrade_increment
+    assert cpu.upgrade_price == 50.0 + 50 * sum(range(2, 7))
+    assert test_upgrade_user.funds == 0
+
+    # failed bulk purchases leave the user untouched
+    test_upgrade_user.funds = 100.0
+    with pytest.raises(InsufficientResources):
+        game_logic_upgrades.purchase_upgrade(test_upgrade_user, HardwareType.CPU_CORES, levels=3)
+    with pytest.raises(MaxUpgradesReached):
+        game_logic_upgrades.purchase_upgrade(test_upgrade_user, HardwareType.CPU_CORES, levels=cpu.remaining_levels + 1)
+    assert cpu.current_level == 6
+    assert test_upgrade_user.funds == 100.0
+
+    # buying the max affordable GPU levels installs the starter GPU first
+    starter_gpu = game_logic_upgrades.starter_gpu()
+    test_upgrade_user.funds = starter_gpu.upgrade_price + starter_gpu.price_of_levels(2) + 1
+    projection = game_logic_upgrades.project_upgrade_prices(test_upgrade_user, HardwareType.GPU, levels=4)
+    assert projection.current_level == 0
+    assert projection.level_prices[0] == starter_gpu.upgrade_price
+    assert projection.cumulative_prices[2] == test_upgrade_user.funds - 1
+    assert projection.max_affordable_levels == 3
+
+    game_logic_upgrades.purchase_upgrade(test_upgrade_user, HardwareType.GPU, levels=None)
+    assert test_upgrade_user.computer.hardware[HardwareType.GPU].current_level == 3
+    assert test_upgrade_user.funds == 1
+
+    print('=== BULK UPGRADES TESTS PASSED ===')
+
+
+def test_processing_power_cache():
+    print('=== TESTING PROCESSING POWER CACHE ===')
+
+    game_logic_cache = TranscodeTycoonGameLogic(disable_backups=True)
+    test_cache_user = game_logic_cache.create_user().user_info
+    computer = test_cache_user.computer
+    assert computer.processing_power == 4.0
+    assert computer.render_seconds_per_second[Format.SD] == (720 * 480 * 30 / 1_000_000) / 4.0
+
+    # upgrading through the game logic, the computer or the hardware itself invalidates the cache
+    test_cache_user.funds = 1_000.0
+    game_logic_cache.purchase_upgrade(test_cache_user, HardwareType.CPU_CORES)
+    assert computer.processing_power == 8.0
+    computer.upgrade(HardwareType.CLOCK_SPEED)
+    assert computer.processing_power == 10.0
+    game_logic_cache.purchase_upgrade(test_cache_user, HardwareType.GPU)
+    assert computer.processing_power == 500.0
+    assert computer.render_seconds_per_second[Format.SD] == (720 * 480 * 30 / 1_000_000) / 500.0
+    computer.hardware[HardwareType.CPU_CORES].upgrade()
+    assert computer.processing_power == 750.0
+    assert computer.render_seconds_per_second[Format.SD] == (720 * 480 * 30 / 1_000_000) / 750.0
+
+    # cached stats don't take part in comparisons, so identical users compare equal
+    user_data = test_cache_user.model_dump(mode='json')
+    assert UserInfo.model_validate(user_data) == UserInfo.model_validate(user_data)
+    assert UserInfo.model_validate(user_data).computer == computer
+
+    # claims use the cached render rates
+    job = game_logic_cache.generate_random_job()
+    game_logic_cache.add_job(job)
+    game_logic_cache.claim_job(job.job_id, test_cache_user)
+    expected_render_time = job.total_run_time * computer.render_seconds_per_second[job.format]
+    assert test_cache_user.job_queue[0].render_time_seconds == round(expected_render_time, 4)
+
+    print('=== PROCESSING POWER CACHE TESTS PASSED ===')
+
+
 ### USERS ###
 def test_users():
     print('=== TESTING USER FUNCTIONS ===')
@@ -93,9 +185,48 @@ def test_users():
     
     assert user_logic.get_user(test_user.user_id).username == update_payload.username
 
+    # fields left out of the payload are left alone
+    user_logic.update_user(user_info=test_user, user_update=PatchUserInfo())
+    assert test_user.username == update_payload.username
+
     print('=== USER TESTS PASSED ===')
 
 
+def test_username_search():
+    print('=== TESTING USERNAME SEARCH ===')
+
+    clock = VirtualClock(start=datetime(2025, 1, 1))
+    search_logic = TranscodeTycoonGameLogic(disable_backups=True, clock=clock)
+    usernames = ['alice', 'Alfred', 'albert', 'bob', 'al']
+    users = {}
+    for username in usernames:
+        user_info = search_logic.create_user().user_info
+        search_logic.update_user(user_info, PatchUserInfo(username=username))
+        users[username] = user_info
+
+    results = search_logic.search_usernames('AL')
+    assert results.total == 4
+    assert [u.username for u in results.users] == ['al', 'albert', 'Alfred', 'alice']
+
+    second_page = search_logic.search_usernames('al', start=2, items=10)
+    assert [u.username for u in second_page.users] == ['Alfred', 'alice']
+
+    # renaming a user moves them in the index
+    search_logic.update_user(users['bob'], PatchUserInfo(username='alvin'))
+    assert search_logic.search_usernames('b').total == 0
+    assert search_logic.search_usernames('alv').users[0].user_id == users['bob'].user_id
+
+    # finished jobs are settled, so search rows match the leaderboard
+    search_logic.refill_job_board()
+    search_logic.claim_job(next(iter(search_logic.jobs)), users['al'])
+    clock.advance(timedelta(days=1))
+    search_row = search_logic.search_usernames('al', items=1).users[0]
+    assert search_row.completed_jobs == 1
+    assert search_row.funds == search_logic.get_leaderboard().users[0].funds > 0
+
+    print('=== USERNAME SEARCH TESTS PASSED ===')
+
+
 ### JOBS ###
 def test_jobs():
     print('=== TESTING JOB FUNCTIONS ===')
@@ -105,7 +236,7 @@ def test_jobs():
     test_job_user = game_logic_jobs.create_user().user_info
 
     game_logic_jobs.prune_available_jobs(cutoff_timestamp=datetime.now() + timedelta(days=1))
-    game_logic_jobs.create_new_jobs()
+    game_logic_jobs.refill_job_board()
 
     max_user_jobs = int(test_job_user.computer.hardware[HardwareType.RAM].value)
 
@@ -136,4 +267,399 @@ def test_jobs():
     assert len(test_job_user.job_queue) == 0
     assert len(test_job_user.completed_jobs) == max_user_jobs
 
+    # completed jobs survive a dump and validated reload unchanged
+    reloaded_user = UserInfo.model_validate(test_job_user.model_dump(mode='json'))
+    assert reloaded_user.model_dump() == test_job_user.model_dump()
+
     print('=== JOB TESTS PASSED ===')
+
+
+def test_job_board_refill(monkeypatch):
+    print('=== TESTING JOB BOARD REFILL ===')
+
+    game_logic_refill = TranscodeTycoonGameLogic(disable_backups=True, job_board_capacity=10, job_refill_latency=0.01)
+    assert game_logic_refill.refill_job_board() == 10
+    assert len(game_logic_refill.job_reserve) == 10
+
+    test_refill_user = game_logic_refill.create_user().user_info
+    claimed_job_id = next(iter(game_logic_refill.jobs))
+
+    async def claim_and_wait():
+        refill_task = asyncio.create_task(game_logic_refill.refill_job_board_continuously())
+        game_logic_refill.claim_job(claimed_job_id, test_refill_user)
+        assert len(game_logic_refill.jobs) == 9
+        await asyncio.sleep(0.1)
+        refill_task.cancel()
+
+    # the background task tops the board up from the reserve shortly after a claim
+    asyncio.run(claim_and_wait())
+    assert len(game_logic_refill.jobs) == 10
+    assert claimed_job_id not in game_logic_refill.jobs
+    assert len(game_logic_refill.job_reserve) == 10
+
+    # a failed refill doesn't stop the background task
+    failed_refills = []
+
+    def failing_refill():
+        failed_refills.append(datetime.now())
+        raise ValueError('Broken job generator')
+
+    failing_logic = TranscodeTycoonGameLogic(disable_backups=True)
+
+    async def refill_in_background():
+        refill_task = asyncio.create_task(failing_logic.refill_job_board_continuously(prune_interval_seconds=0.01))
+        await asyncio.sleep(0.1)
+        refill_task.cancel()
+
+    monkeypatch.setattr(failing_logic, 'refill_job_board', failing_refill)
+    asyncio.run(refill_in_background())
+    assert len(failed_refills) > 1
+
+    print('=== JOB BOARD REFILL TESTS PASSED ===')
+
+
+def test_virtual_clock():
+    print('=== TESTING VIRTUAL CLOCK ===')
+
+    clock = VirtualClock(start=datetime(2025, 1, 1))
+    game_logic_clock = TranscodeTycoonGameLogic(disable_backups=True, clock=clock)
+    test_clock_user = game_logic_clock.create_user().user_info
+
+    game_logic_clock.refill_job_board()
+    job_id = next(iter(game_logic_clock.jobs))
+    game_logic_clock.claim_job(job_id, test_clock_user)
+    queued_job = test_clock_user.job_queue[0]
+    assert queued_job.estimated_completion_ts == datetime(2025, 1, 1) + timedelta(seconds=queued_job.render_time_seconds)
+
+    # frozen clocks only move when advanced, so renders finish without waiting
+    game_logic_clock.check_user_jobs(test_clock_user)
+    assert len(test_clock_user.job_queue) == 1
+    clock.advance(queued_job.render_time_seconds + 1)
+    game_logic_clock.check_user_jobs(test_clock_user)
+    assert len(test_clock_user.completed_jobs) == 1
+
+    # the job board ages with the virtual clock too
+    clock.advance(game_logic_clock.purge_old_job_timedelta)
+    game_logic_clock.prune_available_jobs()
+    assert len(game_logic_clock.jobs) == 0
+
+    # accelerated clocks run `speed` times faster than real time
+    accelerated_clock = VirtualClock(start=datetime(2025, 1, 1), speed=3600)
+    real_start = time.monotonic()
+    time.sleep(0.05)
+    virtual_elapsed = (accelerated_clock.now() - datetime(2025, 1, 1)).total_seconds()
+    real_elapsed = time.monotonic() - real_start
+    assert virtual_elapsed == pytest.approx(real_elapsed * 3600, rel=0.05)
+
+    # clocks have to tell the time
+    with pytest.raises(TypeError):
+        Clock()
+
+    print('=== VIRTUAL CLOCK TESTS PASSED ===')
+
+
+def test_user_stats():
+    print('=== TESTING USER STATS ===')
+
+    clock = VirtualClock(start=datetime(2025, 1, 1))
+    stats_logic = TranscodeTycoonGameLogic(disable_backups=True, clock=clock)
+    stats_user = stats_logic.create_user().user_info
+    stats_logic.refill_job_board()
+    for job_id in list(stats_logic.jobs)[:2]:
+        stats_logic.claim_job(job_id, stats_user)
+    clock.advance(timedelta(days=7))
+
+    user_stats = stats_logic.get_user_stats(stats_user)
+    assert len(stats_user.completed_jobs) == 2
+    assert [len(s.buckets) for s in user_stats.series] == [60, 48, 30]
+    daily = user_stats.series[-1]
+    assert sum(b.completed_jobs for b in daily.buckets) == 2
+    assert round(sum(b.revenue for b in daily.buckets), 2) == stats_user.total_revenue
+    # the computer rendered back to back from the start of the first job to the end of the last
+    busy_seconds = sum(b.utilization * daily.bucket_seconds for b in daily.buckets)
+    assert busy_seconds == pytest.approx(sum(j.render_time_seconds for j in stats_user.completed_jobs), rel=1e-3)
+    # a week later, the jobs have scrolled out of the minute buffer
+    assert sum(b.completed_jobs for b in user_stats.series[0].buckets) == 0
+
+    # history is rebuilt from completed jobs when the recorder is lost (e.g. after a restart)
+    stats_logic.user_stats.clear()
+    assert stats_logic.get_user_stats(stats_user, [StatsResolution.DAY]).series == [daily]
+
+    print('=== USER STATS TESTS PASSED ===')
+
+
+### PERSISTENCE ###
+def test_deferred_state_load(tmp_path):
+    print('=== TESTING DEFERRED STATE LOADING ===')
+
+    writer = TranscodeTycoonGameLogic(state_dir=str(tmp_path))
+    user_ids = [writer.create_user().user_info.user_id for _ in range(3)]
+    writer.refill_job_board()
+    writer.claim_job(next(iter(writer.jobs)), writer.users[user_ids[2]])
+    writer.__dump_state__()
+
+    # nothing is read or validated until the users are accessed
+    reader = TranscodeTycoonGameLogic(state_dir=str(tmp_path))
+    assert reader.users.pending_count == 3
+
+    assert reader.get_user(user_ids[0]).user_id == user_ids[0]
+    assert reader.users.pending_count == 2
+    assert user_ids[1] in reader.users
+
+    # the leaderboard only validates users with jobs to settle, the rest are ranked from their raw state
+    assert reader.get_leaderboard().total == 3
+    assert reader.users.pending_count == 1
+
+    asyncio.run(reader.materialize_users(batch_size=1))
+    assert reader.users.pending_count == 0
+    assert sorted(reader.users) == sorted(user_ids)
+
+    print('=== DEFERRED STATE LOADING TESTS PASSED ===')
+
+
+def test_idle_user_eviction(tmp_path, monkeypatch):
+    print('=== TESTING IDLE USER EVICTION ===')
+
+    eviction_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), user_idle_timeout=timedelta(minutes=30))
+    idle_user = eviction_logic.create_user().user_info
+    idle_user.username = 'idle'
+    active_user = eviction_logic.create_user().user_info
+
+    # nobody has been idle long enough yet
+    assert asyncio.run(eviction_logic.evict_idle_users()) == 0
+
+    eviction_logic.get_user_stats(idle_user)
+    eviction_logic.get_user_stats(active_user)
+    eviction_logic.users._last_access[idle_user.user_id] = datetime.now() - timedelta(hours=1)
+    assert asyncio.run(eviction_logic.evict_idle_users()) == 1
+    assert eviction_logic.users.resident_count == 1
+    assert eviction_logic.users.cold_count == 1
+    # earnings history is only kept for users still in memory
+    assert list(eviction_logic.user_stats) == [active_user.user_id]
+
+    # paged out users are still ranked without being read back in
+    leaderboard = eviction_logic.get_leaderboard()
+    assert leaderboard.total == 2
+    assert eviction_logic.users.cold_count == 1
+
+    # a fresh instance knows about the paged out user and loads it on demand
+    restarted_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path))
+    assert idle_user.user_id in restarted_logic.users
+    assert restarted_logic.users.cold_count == 1
+    assert restarted_logic.get_user(idle_user.user_id).username == 'idle'
+    assert restarted_logic.users.cold_count == 0
+
+    # the page file is deleted once the user is persisted in their shard again
+    restarted_logic.__dump_state__()
+    assert os.listdir(restarted_logic.users.page_dir) == ['index.json']
+    assert TranscodeTycoonGameLogic(state_dir=str(tmp_path)).users[idle_user.user_id].username == 'idle'
+    assert restarted_logic.get_user(active_user.user_id).user_id == active_user.user_id
+
+    # a failed run doesn't stop the periodic eviction
+    failed_runs = []
+
+    async def failing_eviction():
+        failed_runs.append(datetime.now())
+        raise OSError(28, 'No space left on device')
+
+    async def evict_in_background():
+        evict_task = asyncio.create_task(restarted_logic.evict_idle_users_periodically(interval_seconds=0.01))
+        await asyncio.sleep(0.1)
+        evict_task.cancel()
+
+    monkeypatch.setattr(restarted_logic, 'evict_idle_users', failing_eviction)
+    asyncio.run(evict_in_background())
+    assert len(failed_runs) > 1
+
+    print('=== IDLE USER EVICTION TESTS PASSED ===')
+
+
+def test_sharded_state(tmp_path):
+    print('=== TESTING SHARDED STATE ===')
+
+    # state written by older versions lives in a single file
+    legacy_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path))
+    user_ids = [legacy_logic.create_user().user_info.user_id for _ in range(20)]
+    with open(legacy_logic.json_backup, 'w') as json_file:
+        json.dump(legacy_logic.users.dump(), json_file)
+
+    sharded_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), shard_count=4)
+    assert sorted(sharded_logic.users) == sorted(user_ids)
+    assert not os.path.exists(sharded_logic.json_backup)
+    assert len(os.listdir(sharded_logic.shard_dir)) == 4
+
+    # reading users doesn't dirty their shards, and only the shard of a changed user is written back
+    sharded_logic.users.dump_dirty_shards()
+    sharded_logic.users[user_ids[1]]
+    assert sharded_logic.users.dump_dirty_shards() == {}
+    sharded_logic.refill_job_board()
+    sharded_logic.claim_job(next(iter(sharded_logic.jobs)), sharded_logic.users[user_ids[0]])
+    assert list(sharded_logic.users.dump_dirty_shards()) == [sharded_logic.users.shard_of(user_ids[0])]
+
+    # changing the shard count repartitions the existing shards
+    resharded_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), shard_count=3)
+    assert sorted(resharded_logic.users) == sorted(user_ids)
+    assert len(os.listdir(resharded_logic.shard_dir)) == 3
+
+    print('=== SHARDED STATE TESTS PASSED ===')
+
+
+def test_crash_safe_snapshots(tmp_path):
+    print('=== TESTING CRASH SAFE SNAPSHOTS ===')
+
+    writer = TranscodeTycoonGameLogic(state_dir=str(tmp_path), shard_count=2, snapshot_versions=2)
+    user_id = writer.create_user().user_info.user_id
+    shard = writer.users.shard_of(user_id)
+    for funds in (10.0, 20.0, 30.0):
+        writer.users[user_id].funds = funds
+        writer.users.mark_dirty(user_id)
+        writer.__dump_state__()
+    # every dump writes a new version and only the newest `snapshot_versions` are kept
+    shard_files = sorted(f for f in os.listdir(writer.shard_dir) if f.startswith(f'shard-{shard:03d}'))
+    assert len(shard_files) == 2
+
+    # a crash mid-write leaves a torn newest snapshot and a temp file behind
+    newest_snapshot = os.path.join(writer.shard_dir, shard_files[-1])
+    with open(newest_snapshot, 'rb') as snapshot_file:
+        snapshot = snapshot_file.read()
+    with open(newest_snapshot, 'wb') as snapshot_file:
+        snapshot_file.write(snapshot[:len(snapshot) // 2])
+    with open(os.path.join(writer.shard_dir, 'tmpcrash.tmp'), 'wb') as tmp_file:
+        tmp_file.write(b'{"partial')
+
+    # recovery falls back to the newest snapshot that passes its checksum
+    recovered = TranscodeTycoonGameLogic(state_dir=str(tmp_path), shard_count=2, snapshot_versions=2)
+    assert recovered.users[user_id].funds == 20.0
+    assert 'tmpcrash.tmp' not in os.listdir(recovered.shard_dir)
+
+    # new versions are numbered past the torn one and eventually replace it
+    for funds in (40.0, 50.0):
+        recovered.users[user_id].funds = funds
+        recovered.users.mark_dirty(user_id)
+        recovered.__dump_state__()
+    assert not os.path.exists(newest_snapshot)
+    assert TranscodeTycoonGameLogic(state_dir=str(tmp_path), shard_count=2).users[user_id].funds == 50.0
+
+    print('=== CRASH SAFE SNAPSHOTS TESTS PASSED ===')
+
+
+def test_background_flush(tmp_path):
+    print('=== TESTING BACKGROUND FLUSH ===')
+
+    flush_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), flush_interval=0.01, shard_count=1)
+    flush_user = flush_logic.create_user().user_info
+    idle_user = flush_logic.create_user().user_info
+    asyncio.run(flush_logic.flush_state())
+    snapshots = sorted(os.listdir(flush_logic.shard_dir))
+    idle_user_json = flush_logic.users._persisted[idle_user.user_id]
+
+    # requests don't write anything themselves
+    for _ in range(50):
+        flush_logic.get_user(flush_user.user_id)
+    flush_logic.refill_job_board()
+    claimed_job_id = next(iter(flush_logic.jobs))
+    flush_logic.claim_job(claimed_job_id, flush_user)
+    assert sorted(os.listdir(flush_logic.shard_dir)) == snapshots
+
+    async def flush_in_background():
+        flush_task = asyncio.create_task(flush_logic.flush_state_periodically())
+        await asyncio.sleep(0.1)
+        flush_task.cancel()
+
+    # every change since the last flush goes into one new snapshot version
+    asyncio.run(flush_in_background())
+    assert len(os.listdir(flush_logic.shard_dir)) == len(snapshots) + 1
+    # users that didn't change aren't serialized again
+    assert flush_logic.users._persisted[idle_user.user_id] is idle_user_json
+    restarted_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), shard_count=1)
+    assert restarted_logic.users[flush_user.user_id].job_queue[0].job_id == claimed_job_id
+    assert restarted_logic.users[idle_user.user_id] == idle_user
+
+    print('=== BACKGROUND FLUSH TESTS PASSED ===')
+
+
+def test_failed_flush(tmp_path, monkeypatch):
+    print('=== TESTING FAILED FLUSH ===')
+
+    failing_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), user_idle_timeout=timedelta(minutes=30))
+    idle_user = failing_logic.create_user().user_info
+    paged_in_user = failing_logic.create_user().user_info
+    asyncio.run(failing_logic.flush_state())
+    failing_logic.users._last_access[paged_in_user.user_id] = datetime.now() - timedelta(hours=1)
+    assert asyncio.run(failing_logic.evict_idle_users()) == 1
+    failing_logic.get_user(paged_in_user.user_id)
+    failing_logic.users._last_access[idle_user.user_id] = datetime.now() - timedelta(hours=1)
+
+    def disk_full(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+
+    # the cold index write fails after the idle user was paged out
+    with monkeypatch.context() as patch:
+        patch.setattr(failing_logic.users, 'write_cold_index', disk_full)
+        with pytest.raises(OSError):
+            asyncio.run(failing_logic.evict_idle_users())
+    # and the next flush fails too
+    with monkeypatch.context() as patch:
+        patch.setattr(failing_logic, '__write_state__', disk_full)
+        with pytest.raises(OSError):
+            asyncio.run(failing_logic.flush_state())
+
+    # everything is written again by the next flush that succeeds
+    asyncio.run(failing_logic.flush_state())
+    # including removing the page file of the user paged back in
+    assert sorted(os.listdir(failing_logic.users.page_dir)) == sorted([f'{idle_user.user_id}.json', 'index.json'])
+    restarted_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path))
+    assert sorted(restarted_logic.users) == sorted([idle_user.user_id, paged_in_user.user_id])
+    assert restarted_logic.users.cold_count == 1
+
+    print('=== FAILED FLUSH TESTS PASSED ===')
+
+
+def test_export_snapshot(tmp_path):
+    print('=== TESTING EXPORT SNAPSHOT ===')
+
+    clock = VirtualClock(start=datetime(2025, 1, 1))
+    export_logic = TranscodeTycoonGameLogic(state_dir=str(tmp_path), clock=clock, user_idle_timeout=timedelta(minutes=30), shard_count=4)
+    worker = export_logic.create_user().user_info
+    export_logic.refill_job_board()
+    for job_id in list(export_logic.jobs)[:2]:
+        export_logic.claim_job(job_id, worker)
+    clock.advance(timedelta(days=30))
+    export_logic.check_user_jobs(worker)
+    assert len(worker.completed_jobs) == 2
+    idle_users = [export_logic.create_user().user_info.user_id for _ in range(5)]
+    clock.advance(timedelta(hours=1))
+    export_logic.users._last_access[worker.user_id] = clock.now()
+    assert asyncio.run(export_logic.evict_idle_users()) == 5
+
+    stream = asyncio.run(export_logic.export_snapshot(leaderboard_size=3))
+    header = json.loads(next(stream))
+    assert header['type'] == 'snapshot'
+    assert header['total_users'] == 6
+
+    # changes made after the snapshot was taken don't leak into the stream
+    export_logic.users[worker.user_id].username = 'renamed'
+    export_logic.users.mark_all_dirty()
+    export_logic.get_leaderboard()
+    # page files of users paged back in are kept until the export is done with them
+    paged_in_page = os.path.join(export_logic.users.page_dir, f'{idle_users[0]}.json')
+    export_logic.get_user(idle_users[0])
+    export_logic.__dump_state__()
+    assert os.path.exists(paged_in_page)
+
+    records = [json.loads(line) for line in stream]
+    assert all(line.endswith(b'\n') for line in asyncio.run(export_logic.export_snapshot()))
+    assert [r['rank'] for r in records if r['type'] == 'leaderboard'] == [1, 2, 3]
+    exported_users = {r['user_id']: r for r in records if r['type'] == 'user'}
+    assert sorted(exported_users) == sorted([worker.user_id] + idle_users)
+    assert exported_users[worker.user_id]['username'] == ''
+    completed_jobs = [r for r in records if r['type'] == 'completed_job']
+    assert len(completed_jobs) == 2
+    assert all(r['user_id'] == worker.user_id for r in completed_jobs)
+    export_logic.__dump_state__()
+    assert not os.path.exists(paged_in_page)
+
+    with pytest.raises(PersistenceDisabledError):
+        asyncio.run(TranscodeTycoonGameLogic(disable_backups=True).export_snapshot())
+
+    print('=== EXPORT SNAPSHOT TESTS PASSED ===')
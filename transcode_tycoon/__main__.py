@@ -1,17 +1,39 @@
+import asyncio
 import logging
+import tomllib
+from contextlib import asynccontextmanager
+from importlib import metadata
+from os import getenv
 from pathlib import Path
 
-from transcode_tycoon.routes import users, jobs, upgrades
+from transcode_tycoon.routes import users, jobs, upgrades, admin
 from transcode_tycoon.game_logic import game_logic
 from transcode_tycoon.models.users import CreateUserResponse
+from transcode_tycoon.utils.responses import PydanticJSONResponse
+from transcode_tycoon.utils.rate_limit import RateLimit
+from transcode_tycoon.utils.compression import CompressionMiddleware
+from transcode_tycoon.utils.tracing import TraceRecorderMiddleware
 
-import toml
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 import uvicorn
 
 
 BASE_DIR = Path(__file__).resolve().parent
-VERSION = toml.load('pyproject.toml')['project']['version']
+
+
+def get_version() -> str:
+    '''
+    Reads the version from the installed package metadata, falling back to the
+    `pyproject.toml` next to the package when running from a source checkout.
+    '''
+    try:
+        return metadata.version('TranscodeTycoonGame')
+    except metadata.PackageNotFoundError:
+        with open(BASE_DIR.parent / 'pyproject.toml', 'rb') as pyproject:
+            return tomllib.load(pyproject)['project']['version']
+
+
+VERSION = get_version()
 DEBUG = True
 DESCRIPTION = '''A simple API-based idle game. Render video, get paid fake money.
     
@@ -28,11 +50,41 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__file__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # only the raw state is read before accepting traffic, users are validated in the background
+    await asyncio.to_thread(game_logic.users.load)
+    game_logic.refill_job_board()
+    background_tasks = [
+        asyncio.create_task(game_logic.materialize_users()),
+        asyncio.create_task(game_logic.evict_idle_users_periodically()),
+        asyncio.create_task(game_logic.refill_job_board_continuously()),
+        asyncio.create_task(game_logic.flush_state_periodically()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # persist whatever changed since the last periodic flush
+    await game_logic.flush_state()
+
+
 app = FastAPI(
     title="Transcode Tycoon Game API",
     version=VERSION,
     docs_url='/docs',
-    description=DESCRIPTION)
+    description=DESCRIPTION,
+    lifespan=lifespan)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(getenv('TRANSCODE_TYCOON_COMPRESSION_MIN_BYTES', '1024')),
+    gzip_level=int(getenv('TRANSCODE_TYCOON_GZIP_LEVEL', '6')),
+    zstd_level=int(getenv('TRANSCODE_TYCOON_ZSTD_LEVEL', '3')),
+)
+# opt-in request recording for `python -m benchmarks.replay`. added last so it times the whole stack
+if getenv('TRANSCODE_TYCOON_TRACE_FILE'):
+    app.add_middleware(TraceRecorderMiddleware, trace_file=getenv('TRANSCODE_TYCOON_TRACE_FILE'))
 logger.info(f"Starting Transcode Tycoon Game API version {VERSION}")
 
 
@@ -46,17 +98,21 @@ async def render_home_page():
     }
 
 
-@app.post('/register', tags=["Root"])
-async def register_user() -> CreateUserResponse:
+register_rate_limit = RateLimit(requests_per_second=0.1, burst=10)
+
+
+@app.post('/register', tags=["Root"], response_model=CreateUserResponse, dependencies=[Depends(register_rate_limit)])
+async def register_user() -> PydanticJSONResponse:
     '''
     Registers a new user and returns a unique user ID.
     '''
-    return game_logic.create_user()
+    return PydanticJSONResponse(game_logic.create_user())
 
 
 app.include_router(users.router)
 app.include_router(jobs.router)
 app.include_router(upgrades.router)
+app.include_router(admin.router)
 
 
 if __name__ == "__main__":
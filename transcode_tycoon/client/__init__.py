@@ -0,0 +1,4 @@
+from transcode_tycoon.client.client import TranscodeTycoonClient, TranscodeTycoonAPIError
+from transcode_tycoon.client.bot import run_bot
+
+__all__ = ['TranscodeTycoonClient', 'TranscodeTycoonAPIError', 'run_bot']
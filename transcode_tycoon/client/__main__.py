@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+import logging
+
+from transcode_tycoon.client import TranscodeTycoonClient, run_bot
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Runs the reference Transcode Tycoon bot.')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--token', default=None, help='Token of an existing user. Registers a new user if omitted.')
+    parser.add_argument('--poll-seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    async with TranscodeTycoonClient(args.url, token=args.token) as client:
+        await run_bot(client, poll_seconds=args.poll_seconds)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
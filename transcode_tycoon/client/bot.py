@@ -0,0 +1,61 @@
+import asyncio
+import logging
+
+from transcode_tycoon.client.client import TranscodeTycoonClient, TranscodeTycoonAPIError
+from transcode_tycoon.models.computer import HardwareType
+from transcode_tycoon.models.users import UserInfo
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+# faster renders first, then a longer queue
+UPGRADE_PRIORITY = [HardwareType.GPU, HardwareType.CPU_CORES, HardwareType.CLOCK_SPEED, HardwareType.RAM]
+
+
+async def run_bot(client: TranscodeTycoonClient, max_rounds: int | None = None, poll_seconds: float = 5.0) -> UserInfo:
+    '''
+    Reference bot: spends all funds on upgrades, then fills the render queue with the jobs that
+    pay the most per second of render time. Registers a new user if the client has no token.
+
+    Runs forever unless `max_rounds` is set, and returns the final user info.
+    '''
+    if client.token is None:
+        created_user = await client.register()
+        logger.info(f'Registered bot user {created_user.user_info.user_id}')
+
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        user_info = await client.my_info()
+        for upgrade_type in UPGRADE_PRIORITY:
+            try:
+                user_info = await client.purchase_upgrade(upgrade_type, buy_max=True)
+            except TranscodeTycoonAPIError as e:
+                if e.status_code not in (httpx.codes.PAYMENT_REQUIRED, httpx.codes.FORBIDDEN):
+                    raise
+
+        free_slots = int(user_info.computer.hardware[HardwareType.RAM].value) - len(user_info.job_queue)
+        if free_slots > 0:
+            render_rates = user_info.computer.render_seconds_per_second
+            jobs = sorted(
+                await client.list_jobs(),
+                key=lambda j: j.payout / (j.total_run_time * render_rates[j.format]),
+                reverse=True
+            )
+            claims = await client.claim_jobs(j.job_id for j in jobs[:free_slots])
+            lost_claims = sum(isinstance(c, TranscodeTycoonAPIError) for c in claims)
+            # somebody beat us to some of the jobs, fall back to whatever is left on the board
+            remaining_jobs = [j.job_id for j in jobs[free_slots:]]
+            for _ in range(lost_claims):
+                try:
+                    await client.claim_any(remaining_jobs)
+                except TranscodeTycoonAPIError as e:
+                    logger.info(f'Unable to fill the render queue: {e}')
+                    break
+            logger.info(f'Claimed {len(claims) - lost_claims} of {len(claims)} best paying jobs')
+
+        rounds += 1
+        if max_rounds is None or rounds < max_rounds:
+            await asyncio.sleep(poll_seconds)
+    return await client.my_info()
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from collections.abc import Iterable
+
+from transcode_tycoon.models.computer import HardwareType, HardwareStats, UpgradePriceProjection
+from transcode_tycoon.models.jobs import JobInfo
+from transcode_tycoon.models.stats import StatsResolution, UserStats
+from transcode_tycoon.models.users import UserInfo, CreateUserResponse, LeaderboardUser, Leaderboard
+
+import httpx
+from pydantic import TypeAdapter
+
+
+logger = logging.getLogger(__name__)
+
+job_list_adapter = TypeAdapter(list[JobInfo])
+hardware_adapter = TypeAdapter(dict[HardwareType, HardwareStats])
+
+
+class TranscodeTycoonAPIError(Exception):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(f'{status_code}: {detail}')
+        self.status_code = status_code
+        self.detail = detail
+
+
+class TranscodeTycoonClient:
+    '''
+    Async client for the Transcode Tycoon API.
+
+    All requests share one pooled keep-alive `httpx.AsyncClient` and at most `max_concurrency`
+    requests are in flight at once. Rate limited requests are retried after their `Retry-After`,
+    and the job board is cached locally using its `ETag`. Use it as an async context manager:
+
+        async with TranscodeTycoonClient('http://localhost:8000') as client:
+            await client.register()
+            print(await client.my_info())
+    '''
+    def __init__(
+            self,
+            base_url: str = 'http://localhost:8000',
+            token: str | None = None,
+            max_concurrency: int = 8,
+            retries: int = 3,
+            backoff_seconds: float = 0.25,
+            timeout_seconds: float = 10.0,
+            transport: httpx.AsyncBaseTransport | None = None,
+        ) -> None:
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout_seconds,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+        self._job_board_etag: str | None = None
+        self._job_board: list[JobInfo] = []
+        if token:
+            self.token = token
+
+    @property
+    def token(self) -> str | None:
+        authorization = self._http.headers.get('Authorization')
+        return authorization.removeprefix('Bearer ') if authorization else None
+
+    @token.setter
+    def token(self, token: str) -> None:
+        self._http.headers['Authorization'] = f'Bearer {token}'
+
+    async def __aenter__(self) -> 'TranscodeTycoonClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                response = await self._http.request(method, url, **kwargs)
+            if response.status_code != 429 or attempt == self.retries:
+                break
+            retry_after = float(response.headers.get('Retry-After', self.backoff_seconds * 2 ** attempt))
+            logger.info(f'Rate limited on {method} {url}, retrying in {retry_after} seconds')
+            await asyncio.sleep(retry_after)
+
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('detail', response.text)
+            except ValueError:
+                detail = response.text
+            raise TranscodeTycoonAPIError(response.status_code, str(detail))
+        return response
+
+    ### USERS ###
+    async def register(self) -> CreateUserResponse:
+        '''
+        Registers a new user and authenticates every following request as them.
+        '''
+        response = await self._request('POST', '/register')
+        created_user = CreateUserResponse.model_validate_json(response.content)
+        self.token = created_user.token
+        return created_user
+
+    async def my_info(self) -> UserInfo:
+        response = await self._request('GET', '/users/my_info')
+        return UserInfo.model_validate_json(response.content)
+
+    async def my_stats(self, resolutions: Iterable[StatsResolution] | None = None) -> UserStats:
+        '''
+        Revenue, completed jobs and render utilization over time. Every resolution by default.
+        '''
+        params = {'resolution': [str(r) for r in resolutions]} if resolutions else None
+        response = await self._request('GET', '/users/my_stats', params=params)
+        return UserStats.model_validate_json(response.content)
+
+    async def update_username(self, username: str) -> UserInfo:
+        response = await self._request('PATCH', '/users/my_info', json={'username': username})
+        return UserInfo.model_validate_json(response.content)
+
+    async def search_user(self, user_id: str) -> LeaderboardUser:
+        response = await self._request('GET', f'/users/search/{user_id}')
+        return LeaderboardUser.model_validate_json(response.content)
+
+    async def search_usernames(self, prefix: str, start: int = 0, items: int = 10) -> Leaderboard:
+        '''
+        Users whose username starts with `prefix` (case-insensitive), in alphabetical order.
+        '''
+        response = await self._request(
+            'GET', '/users/search', params={'username_prefix': prefix, 'start': start, 'items': items})
+        return Leaderboard.model_validate_json(response.content)
+
+    async def leaderboard(self, start: int = 0, items: int = 10) -> Leaderboard:
+        response = await self._request('GET', '/users/leaderboard', params={'start': start, 'items': items})
+        return Leaderboard.model_validate_json(response.content)
+
+    ### JOBS ###
+    async def list_jobs(self) -> list[JobInfo]:
+        '''
+        All available jobs. Unchanged job boards are served from the local copy.
+        '''
+        headers = {'If-None-Match': self._job_board_etag} if self._job_board_etag else {}
+        response = await self._request('GET', '/jobs/', headers=headers)
+        if response.status_code != 304:
+            self._job_board = job_list_adapter.validate_json(response.content)
+            self._job_board_etag = response.headers.get('ETag')
+        return list(self._job_board)
+
+    async def get_job(self, job_id: str) -> JobInfo:
+        response = await self._request('GET', '/jobs/', params={'job_id': job_id})
+        return JobInfo.model_validate_json(response.content)
+
+    async def claim_job(self, job_id: str) -> UserInfo:
+        response = await self._request('POST', '/jobs/claim', params={'job_id': job_id})
+        return UserInfo.model_validate_json(response.content)
+
+    async def claim_any(self, job_ids: Iterable[str] | None = None) -> UserInfo:
+        '''
+        Claims the first job in `job_ids` (the whole job board by default) that nobody else got to first.
+
+        Losing a claim race returns a 404, so the next candidate is tried after an exponential
+        backoff, refreshing the job board once the candidates run out.
+        '''
+        candidates = list(job_ids) if job_ids is not None else [j.job_id for j in await self.list_jobs()]
+        for attempt in range(self.retries + 1):
+            for job_id in candidates:
+                try:
+                    return await self.claim_job(job_id)
+                except TranscodeTycoonAPIError as e:
+                    if e.status_code != 404:
+                        raise
+            await asyncio.sleep(self.backoff_seconds * 2 ** attempt)
+            candidates = [j.job_id for j in await self.list_jobs()]
+        raise TranscodeTycoonAPIError(404, 'Unable to claim any of the available jobs.')
+
+    async def claim_jobs(self, job_ids: Iterable[str]) -> list[UserInfo | TranscodeTycoonAPIError]:
+        '''
+        Claims several jobs concurrently. Failed claims are returned in place instead of raised.
+        '''
+        results = await asyncio.gather(
+            *(self.claim_job(job_id) for job_id in job_ids),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, TranscodeTycoonAPIError):
+                raise result
+        return results
+
+    async def delete_job(self, job_id: str) -> UserInfo:
+        response = await self._request('DELETE', '/jobs/delete', params={'job_id': job_id})
+        return UserInfo.model_validate_json(response.content)
+
+    ### UPGRADES ###
+    async def list_upgrades(self) -> dict[HardwareType, HardwareStats]:
+        response = await self._request('GET', '/upgrades/list')
+        return hardware_adapter.validate_json(response.content)
+
+    async def upgrade_prices(self, upgrade_type: HardwareType, levels: int = 1) -> UpgradePriceProjection:
+        response = await self._request(
+            'GET', '/upgrades/prices', params={'upgrade_type': upgrade_type, 'levels': levels})
+        return UpgradePriceProjection.model_validate_json(response.content)
+
+    async def purchase_upgrade(self, upgrade_type: HardwareType, levels: int = 1, buy_max: bool = False) -> UserInfo:
+        response = await self._request(
+            'POST', '/upgrades/purchase',
+            params={'upgrade_type': upgrade_type, 'levels': levels, 'buy_max': buy_max})
+        return UserInfo.model_validate_json(response.content)
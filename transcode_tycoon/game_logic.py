@@ -1,16 +1,31 @@
+import asyncio
 import logging
+import threading
 from datetime import datetime, timedelta
 from uuid import uuid4
-from random import choice
+from random import Random
 import json
-from os import path, makedirs
-
-from transcode_tycoon.models.users import UserInfo, CreateUserResponse, PatchUserInfo
+import re
+from collections.abc import Callable, Iterator
+from typing import Any, BinaryIO
+from itertools import accumulate, chain
+from glob import glob
+from os import path, makedirs, getenv, remove, replace
+
+from transcode_tycoon.models.users import UserInfo, CreateUserResponse, PatchUserInfo, Leaderboard, LeaderboardUser
 from transcode_tycoon.models.jobs import JobInfo, JobInfoQueued, JobStatus, Format, Priority
-from transcode_tycoon.models.computer import ComputerInfo, HardwareType, HardwareStats
+from transcode_tycoon.models.computer import ComputerInfo, HardwareType, HardwareStats, MaxUpgradesReached, UpgradePriceProjection
+from transcode_tycoon.models.stats import STATS_RESOLUTIONS, StatsResolution, UserStats
+from transcode_tycoon.utils.user_store import UserStore
+from transcode_tycoon.utils.clock import Clock, SystemClock
+from transcode_tycoon.utils.username_index import UsernameIndex
+from transcode_tycoon.utils.files import write_bytes_atomic
+from transcode_tycoon.utils.snapshots import SnapshotCorruptedError, encode_snapshot, decode_snapshot, read_snapshot
+from transcode_tycoon.utils.stats import UserStatsRecorder
 
 import numpy as np
 import hashlib
+from pydantic import TypeAdapter
 
 class ItemNotFoundError(Exception):
     pass
@@ -27,9 +42,17 @@ class ComputerUpgradeError(Exception):
 class InsufficientResources(Exception):
     pass
 
+class PersistenceDisabledError(Exception):
+    pass
+
+# versioned snapshots are `shard-003.v00000012.snapshot`. plain `shard-003.json` shards predate them
+SHARD_FILE_PATTERN = re.compile(r'shard-(?P<shard>\d+)(?:\.v(?P<version>\d+)\.snapshot|\.json)')
+
 
 logger = logging.getLogger(__name__)
 
+job_board_adapter = TypeAdapter(list[JobInfo])
+
 
 class TranscodeTycoonGameLogic:
     # TODO - replace with an actual database like SQLite
@@ -37,64 +60,335 @@ class TranscodeTycoonGameLogic:
             self,
             job_board_capacity: int = 50,
             disable_backups: bool = False,
+            state_dir: str | None = None,
+            user_idle_timeout: timedelta | None = None,
+            shard_count: int = 16,
+            clock: Clock | None = None,
+            job_refill_latency: float = 0.5,
+            seed: int | None = None,
+            snapshot_versions: int = 3,
+            flush_interval: float = 5.0,
         ) -> None:
         
+        # all game time comes from here so simulations can swap in a VirtualClock
+        self.clock = clock or SystemClock()
         self.job_capacity = job_board_capacity
         self.disable_backups = disable_backups
         self.purge_old_job_timedelta = timedelta(hours=6)
-
-        self.users: dict[str, UserInfo] = {}
+        # users idle for longer than this are paged out to disk. None keeps everyone in memory
+        self.user_idle_timeout = user_idle_timeout
+
+        self.state_dir = state_dir or path.join(path.dirname(path.abspath(__file__)), 'data')
+        # single-file state from before sharding. migrated into shards on first load
+        self.json_backup = path.join(self.state_dir, 'tycoon_state.json')
+        self.shard_dir = path.join(self.state_dir, 'shards')
+        self.shard_count = shard_count
+        # every dump writes new snapshot versions of the dirty shards. this many are kept per shard
+        self.snapshot_versions = snapshot_versions
+        self._snapshot_version = 0
+        self._shard_snapshots: dict[int, list[tuple[int, str]]] = {}
+        self._current_snapshots: dict[int, str] = {}
+        # changes are persisted by a background flush this often, in seconds, instead of on every request
+        self.flush_interval = flush_interval
+        # held while state files are written, so only one flush or eviction writes at a time
+        self._flush_lock = asyncio.Lock()
+        # page files of paged in users are kept while an export may still read them. exports
+        # finish in a worker thread, hence the lock
+        self._open_exports = 0
+        self._exports_lock = threading.Lock()
+        self._deferred_pages: list[str] = []
+
+        # persisted state is read on first access, so constructing the game logic is cheap
+        self.users = UserStore(
+            loader=self.__load_state__,
+            page_dir=path.join(self.state_dir, 'cold_users'),
+            shard_count=shard_count,
+            clock=self.clock.now,
+        )
+        # built from the persisted users the first time it's needed
+        self._username_index: UsernameIndex | None = None
+        # earnings history per resident user. kept in memory only and rebuilt from completed jobs
+        # after a restart or when a paged out user comes back
+        self.user_stats: dict[str, UserStatsRecorder] = {}
         # TODO: create user-specific job boards to prevent pulling the same job twice
         # maybe cater them towards the user's compute capacity?
         self.jobs: dict[str, JobInfo] = {}
+        # bumped on every change to the job board. the epoch keeps versions from
+        # a previous process from matching the current one
+        self.jobs_version = 0
+        self.jobs_epoch = uuid4().hex[:8]
+        self._job_board_cache: tuple[int, bytes] | None = None
+        # pre-generated jobs used to top the board back up without generating them on demand
+        self.job_reserve: list[JobInfo] = []
+        # seconds to wait after a claim before refilling, so bursts of claims share one refill
+        self.job_refill_latency = job_refill_latency
+        # job generation only draws from these, so a seed makes the job stream reproducible
+        self.random = Random(seed)
+        self.np_random = np.random.default_rng(seed)
+        self._job_board_claimed = asyncio.Event()
 
-        self.json_backup = path.join(
-            path.dirname(path.abspath(__file__)),
-            'data', 'tycoon_state.json'
-        )
+    ### UTILITIES ###
+    def __shard_file__(self, shard: int, version: int) -> str:
+        return path.join(self.shard_dir, f'shard-{shard:03d}.v{version:08d}.snapshot')
 
-        self.__load_state__()
+    def __read_json__(self, file_path: str) -> dict:
+        with open(file_path, 'r') as json_file:
+            return json.load(json_file)
 
-    ### UTILITIES ###
-    def __calculate_render_difficulty__(self, job_info: JobInfo) -> float:
-        match job_info.format:
-            case Format.SD:
-                pixels = 720 * 480
-            case Format.HD:
-                pixels = 1280 * 720
-            case Format.FHD:
-                pixels = 1920 * 1080
-            case Format.UHD:
-                pixels = 3840 * 2160
-            case _:
-                raise UnsupportedFormatError(f"Unsupported format: {job_info.format}")
-        # assuming 30 fps
-        pps = (pixels * 30) * job_info.total_run_time
-        # in megabits per second
-        return round(pps / 1_000_000, 2)
-    
-    def __dump_state__(self) -> None:
-        if not path.exists(path.dirname(self.json_backup)):
-            makedirs(path.dirname(self.json_backup))
+    def __write_shard__(self, shard: int, users: dict[str, bytes | dict], version: int) -> None:
+        '''
+        Writes a new snapshot version of a shard, then deletes the ones beyond `snapshot_versions`.
+        '''
+        shard_file = self.__shard_file__(shard, version)
+        write_bytes_atomic(shard_file, encode_snapshot(
+            users, shard=shard, shard_count=self.shard_count, version=version))
+        self._current_snapshots[shard] = shard_file
+        snapshots = self._shard_snapshots.setdefault(shard, [])
+        snapshots.append((version, shard_file))
+        while len(snapshots) > self.snapshot_versions:
+            remove(snapshots.pop(0)[1])
+
+    def __write_state__(self, dirty_shards: dict[int, dict[str, bytes | dict]], cold_index: dict | None, version: int) -> None:
+        '''
+        Writes the dirty shards as snapshot `version`, then the cold index. Doesn't touch the
+        users, so flushes run it in a worker thread.
+        '''
+        makedirs(self.shard_dir, exist_ok=True)
+        for shard, users in dirty_shards.items():
+            self.__write_shard__(shard, users, version)
+        self.users.write_cold_index(cold_index)
+        if dirty_shards:
+            logger.info(f'Dumped {len(dirty_shards)} state shards to: {self.shard_dir}')
 
+    def __dump_state__(self) -> None:
+        '''
+        Writes a new snapshot version of every shard holding a user that changed since the last
+        dump, on the calling thread. The API persists through `flush_state` instead.
+        '''
         if not self.disable_backups:
-            with open(self.json_backup, 'w') as json_file:
-                user_dump = {
-                    k: v.model_dump(mode='json') for k, v in self.users.items()
-                }
-                json.dump(user_dump, json_file, indent=2)
-                logger.info(f'Dumped users to: {self.json_backup}')
-
-    def __load_state__(self) -> None:
-        if path.exists(self.json_backup) and not self.disable_backups:
-            with open(self.json_backup, 'r') as json_file:
-                user_load = json.load(json_file)
-                self.users = {
-                    k: UserInfo.model_validate(v) for k, v in user_load.items()
-                }
-                logger.info(f'Successfully loaded JSON backup file: {self.json_backup}')
-        else:
-            logger.info(f'Unable to load previous user state. File does not exist.')
+            stale_pages = self.users.take_stale_pages()
+            dirty_shards = self.users.dump_dirty_shards()
+            cold_index = self.users.dump_cold_index()
+            if dirty_shards:
+                self._snapshot_version += 1
+            try:
+                self.__write_state__(dirty_shards, cold_index, self._snapshot_version)
+            except Exception:
+                self.users.mark_unsaved(dirty_shards, cold_index, stale_pages)
+                raise
+            self.__remove_stale_pages__(stale_pages)
+
+    async def __in_thread__(self, func: Callable[..., None], *args: Any) -> None:
+        '''
+        Runs `func` in a worker thread. A cancelled caller still waits for it to finish, so the
+        flush lock is never released while files are being written.
+        '''
+        write = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            await write
+            raise
+
+    async def __flush_state__(self) -> None:
+        # users that changed are serialized here on the event loop, so the snapshot is consistent.
+        # everyone else is reused from the last dump
+        stale_pages = self.users.take_stale_pages()
+        dirty_shards = self.users.dump_dirty_shards()
+        cold_index = self.users.dump_cold_index()
+        if dirty_shards:
+            self._snapshot_version += 1
+        if dirty_shards or cold_index is not None:
+            try:
+                await self.__in_thread__(self.__write_state__, dirty_shards, cold_index, self._snapshot_version)
+            except Exception:
+                # written again by the next flush
+                self.users.mark_unsaved(dirty_shards, cold_index, stale_pages)
+                raise
+        self.__remove_stale_pages__(stale_pages)
+
+    async def flush_state(self) -> None:
+        '''
+        Persists every shard holding a user that changed since the last flush. Encoding, writing
+        and syncing the files to disk happen in a worker thread.
+        '''
+        if self.disable_backups:
+            return
+        async with self._flush_lock:
+            await self.__flush_state__()
+
+    async def flush_state_periodically(self) -> None:
+        '''
+        Background task that coalesces every change made within `flush_interval` into one flush.
+        '''
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_state()
+            except OSError as e:
+                logger.error(f'Failed to persist state, retrying on the next flush: {e}')
+
+    def __remove_stale_pages__(self, stale_pages: list[str]) -> None:
+        '''
+        Deletes the page files of users paged back in, now that their shards are persisted.
+        Deferred while an export is open, since it may still be reading them.
+        '''
+        self._deferred_pages.extend(stale_pages)
+        with self._exports_lock:
+            if self._open_exports == 0:
+                self.users.remove_stale_pages(self._deferred_pages)
+                self._deferred_pages = []
+
+    def __repartition_state__(self, user_load: dict[str, dict]) -> None:
+        '''
+        Rewrites all users into `shard_count` shards. Used to migrate older state layouts and
+        whenever the configured shard count changes. Older files are only deleted once every
+        new shard is on disk.
+        '''
+        makedirs(self.shard_dir, exist_ok=True)
+        shards: list[dict[str, dict]] = [{} for _ in range(self.shard_count)]
+        for user_id, user_data in user_load.items():
+            shards[self.users.shard_of(user_id)][user_id] = user_data
+        # the manifest held the shard count before it moved into the snapshot headers
+        stale_files = glob(path.join(self.shard_dir, 'shard-*')) + glob(path.join(self.shard_dir, 'manifest.json'))
+        self._shard_snapshots = {}
+        self._current_snapshots = {}
+        self._snapshot_version += 1
+        for shard, users in enumerate(shards):
+            self.__write_shard__(shard, users, self._snapshot_version)
+        for stale_file in stale_files:
+            remove(stale_file)
+        logger.info(f'Partitioned {len(user_load)} users into {self.shard_count} shards')
+
+    def __recover_shard__(self, shard: int, snapshots: list[tuple[int, str]]) -> tuple[int, int | None, dict[str, dict]] | None:
+        '''
+        Newest snapshot of a shard that passes its checksum, as `(version, shard_count, users)`.
+        Unversioned shards from before snapshots were checksummed are read as version 0.
+        '''
+        for version, shard_file in sorted(snapshots, reverse=True):
+            try:
+                if version == 0:
+                    users, shard_count = self.__read_json__(shard_file), None
+                else:
+                    header, users = read_snapshot(shard_file)
+                    shard_count = header['shard_count']
+            except (SnapshotCorruptedError, ValueError) as e:
+                logger.warning(f'Skipping unreadable state snapshot {shard_file}: {e}')
+                continue
+            if version != snapshots[-1][0]:
+                logger.warning(f'Recovered shard {shard} from older snapshot: {shard_file}')
+            self._current_snapshots[shard] = shard_file
+            return version, shard_count, users
+        return None
+
+    def __recover_state__(self) -> dict[str, dict]:
+        '''
+        Reads the newest valid snapshot of every shard, falling back to older versions when the
+        newest one is corrupted. Repartitions the shards if they were written with a different
+        shard count or in an older layout.
+        '''
+        for tmp_file in glob(path.join(self.shard_dir, '*.tmp')):
+            # left behind by a crash mid-write. the snapshot it would have replaced is still there
+            remove(tmp_file)
+
+        snapshots: dict[int, list[tuple[int, str]]] = {}
+        for shard_file in glob(path.join(self.shard_dir, 'shard-*')):
+            match = SHARD_FILE_PATTERN.fullmatch(path.basename(shard_file))
+            if match:
+                version = int(match['version'] or 0)
+                snapshots.setdefault(int(match['shard']), []).append((version, shard_file))
+        self._shard_snapshots = {shard: sorted(versions) for shard, versions in snapshots.items()}
+        self._snapshot_version = max((v for versions in snapshots.values() for v, _ in versions), default=0)
+
+        # parsed one after the other. json holds the GIL, so worker threads only add overhead.
+        # see benchmarks/startup.py
+        recovered = [
+            r for r in map(self.__recover_shard__, self._shard_snapshots.keys(), self._shard_snapshots.values())
+            if r is not None
+        ]
+        if len(recovered) < len(snapshots):
+            logger.error(f'{len(snapshots) - len(recovered)} state shards have no readable snapshot left')
+
+        user_load = {}
+        # oldest first, so a user left in two shards by an interrupted repartition keeps their newest state
+        for _, _, users in sorted(recovered, key=lambda r: r[0]):
+            user_load.update(users)
+        logger.info(f'Recovered {len(recovered)} state shards from: {self.shard_dir}')
+
+        if any(shard_count != self.shard_count for _, shard_count, _ in recovered):
+            self.__repartition_state__(user_load)
+        return user_load
+
+    def __load_state__(self) -> dict[str, dict]:
+        '''
+        Reads the raw persisted users. Validation is left to the `UserStore` so it can happen lazily.
+        '''
+        if self.disable_backups:
+            return {}
+
+        if glob(path.join(self.shard_dir, 'shard-*')):
+            return self.__recover_state__()
+
+        if path.exists(self.json_backup):
+            user_load = self.__read_json__(self.json_backup)
+            logger.info(f'Migrating single-file JSON backup into shards: {self.json_backup}')
+            self.__repartition_state__(user_load)
+            replace(self.json_backup, f'{self.json_backup}.migrated')
+            return user_load
+
+        logger.info(f'Unable to load previous user state. File does not exist.')
+        return {}
+
+    async def materialize_users(self, batch_size: int = 250) -> None:
+        '''
+        Validates persisted users in small batches, yielding to the event loop in between
+        so requests keep being served while the remaining users stream in.
+        '''
+        while self.users.materialize(limit=batch_size) > 0:
+            await asyncio.sleep(0)
+        logger.info(f'Finished loading {len(self.users)} users')
+
+    async def evict_idle_users(self) -> int:
+        '''
+        Pages out users that haven't been accessed within `user_idle_timeout`, then persists
+        the remaining state without them. The page files are written in a worker thread.
+        Returns the number of evicted users.
+        '''
+        if self.disable_backups or self.user_idle_timeout is None:
+            return 0
+        # settle finished renders first so idle users with completed queues can be paged out
+        for user_info in self.users.resident_users():
+            self.check_user_jobs(user_info)
+        idle_cutoff = self.clock.now() - self.user_idle_timeout
+        async with self._flush_lock:
+            idle_users = self.users.idle_users(idle_cutoff)
+            if not idle_users:
+                return 0
+            await self.__in_thread__(self.users.write_pages, idle_users)
+            evicted = self.users.page_out(idle_users, idle_cutoff)
+            # rebuilt from completed jobs if the user comes back
+            self.user_stats = {
+                user_id: recorder for user_id, recorder in self.user_stats.items()
+                if self.users.is_resident(user_id)
+            }
+            # the index has to list the paged out users before their shards stop holding them
+            cold_index = self.users.dump_cold_index()
+            try:
+                await self.__in_thread__(self.users.write_cold_index, cold_index)
+            except Exception:
+                self.users.mark_unsaved((), cold_index, [])
+                raise
+            await self.__flush_state__()
+        return evicted
+
+    async def evict_idle_users_periodically(self, interval_seconds: float = 60.0) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.evict_idle_users()
+            except Exception:
+                # the idle users stay in memory and are paged out by the next run
+                logger.exception('Failed to page out idle users, retrying on the next run')
 
     ### COMPUTERS ###
     def __calculate_completion_timedelta__(self, job_info: JobInfo, computer_info: ComputerInfo) -> float:
@@ -105,8 +399,8 @@ class TranscodeTycoonGameLogic:
         # SD video at 2 minutes = 1,244.16 million pixels
         # 2 CPUs * 2.0 GHz * 10 = 40.0 compute score
         # 1244.16 mill pix / 40.0 compute score = 31.104 seconds processing time
-        difficulty = self.__calculate_render_difficulty__(job_info)
-        return round(difficulty / computer_info.processing_power, 4)
+        # the per-format render rates are cached on the computer until its hardware changes
+        return round(job_info.total_run_time * computer_info.render_seconds_per_second[job_info.format], 4)
     
     def create_new_computer(self) -> ComputerInfo:
         comp = ComputerInfo(
@@ -143,26 +437,97 @@ class TranscodeTycoonGameLogic:
             max_level=8
         )
 
-    def purchase_upgrade(self, user_info: UserInfo, upgrade_type: HardwareType) -> UserInfo:
-        existing_hardware = True
+    def list_upgrades(self, user_info: UserInfo) -> dict[HardwareType, HardwareStats]:
+        '''
+        The user's hardware, plus the starter GPU when they don't have one yet.
+        '''
+        # copy so listing the starter GPU doesn't install it in the user's computer
+        user_hardware = dict(user_info.computer.hardware)
+        if HardwareType.GPU not in user_hardware:
+            user_hardware[HardwareType.GPU] = self.starter_gpu()
+        return user_hardware
+
+    def __get_upgrade_target__(self, user_info: UserInfo, upgrade_type: HardwareType) -> tuple[HardwareStats, bool]:
+        '''
+        Returns the hardware an upgrade applies to and whether the user already has it installed.
+        '''
         if upgrade_type == HardwareType.GPU and HardwareType.GPU not in user_info.computer.hardware:
             # GPUS aren't included in the default computers, so we can't upgrade an existing item
-            hardware_stat = self.starter_gpu()
-            existing_hardware = False
+            return self.starter_gpu(), False
+        return user_info.computer.hardware[upgrade_type], True
+
+    def __purchasable_levels__(self, hardware_stat: HardwareStats, installed: bool) -> int:
+        # installing new hardware is a purchase that doesn't raise its level
+        return hardware_stat.remaining_levels + (0 if installed else 1)
+
+    def __upgrade_cost__(self, hardware_stat: HardwareStats, installed: bool, levels: int) -> float:
+        if installed or levels == 0:
+            return hardware_stat.price_of_levels(levels)
+        return round(hardware_stat.upgrade_price + hardware_stat.price_of_levels(levels - 1), 2)
+
+    def max_affordable_levels(self, user_info: UserInfo, upgrade_type: HardwareType) -> int:
+        '''
+        Binary search over the closed form upgrade cost for the most levels the user can pay for.
+        '''
+        hardware_stat, installed = self.__get_upgrade_target__(user_info, upgrade_type)
+        low, high = 0, self.__purchasable_levels__(hardware_stat, installed)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.__upgrade_cost__(hardware_stat, installed, mid) <= user_info.funds:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    def project_upgrade_prices(self, user_info: UserInfo, upgrade_type: HardwareType, levels: int) -> UpgradePriceProjection:
+        '''
+        Prices of the next `levels` upgrades without buying anything. Capped at the maximum level.
+        '''
+        hardware_stat, installed = self.__get_upgrade_target__(user_info, upgrade_type)
+        levels = min(levels, self.__purchasable_levels__(hardware_stat, installed))
+        if installed:
+            level_prices = hardware_stat.level_prices(levels)
         else:
-            hardware_stat = user_info.computer.hardware[upgrade_type]
+            level_prices = ([hardware_stat.upgrade_price] + hardware_stat.level_prices(levels - 1))[:levels]
+        return UpgradePriceProjection(
+            upgrade_type=upgrade_type,
+            current_level=hardware_stat.current_level if installed else 0,
+            max_level=hardware_stat.max_level,
+            level_prices=level_prices,
+            cumulative_prices=[round(p, 2) for p in accumulate(level_prices)],
+            max_affordable_levels=self.max_affordable_levels(user_info, upgrade_type),
+        )
 
-        if hardware_stat.upgrade_price > user_info.funds:
+    def purchase_upgrade(self, user_info: UserInfo, upgrade_type: HardwareType, levels: int | None = 1) -> UserInfo:
+        '''
+        Buys `levels` upgrades at once, or as many as the user can afford when `levels` is `None`.
+        Either every level is applied and paid for or nothing changes.
+        '''
+        hardware_stat, installed = self.__get_upgrade_target__(user_info, upgrade_type)
+        purchasable_levels = self.__purchasable_levels__(hardware_stat, installed)
+        if levels is None:
+            # still attempt a single level when nothing is affordable so the error explains why
+            levels = max(self.max_affordable_levels(user_info, upgrade_type), 1)
+        if levels < 1:
+            raise ComputerUpgradeError(f'Must purchase at least 1 upgrade level, got {levels}.')
+        if levels > purchasable_levels:
+            raise MaxUpgradesReached(
+                f'Unable to purchase {levels} {upgrade_type} upgrades. Upgrades remaining: {purchasable_levels}')
+
+        price = self.__upgrade_cost__(hardware_stat, installed, levels)
+        if price > user_info.funds:
             raise InsufficientResources(
-                f"You lack enough funds to purchase a {upgrade_type} upgrade. Price: ${hardware_stat.upgrade_price} | Funds: ${user_info.funds}"
+                f"You lack enough funds to purchase {levels} {upgrade_type} upgrade(s). Price: ${price} | Funds: ${user_info.funds}"
             )
         
-        user_info.funds -= hardware_stat.upgrade_price
-        logger.info(f'User {user_info.user_id} purchased {upgrade_type} upgrade for {hardware_stat.upgrade_price}.')
-        if existing_hardware:
-            hardware_stat.upgrade()
+        user_info.funds -= price
+        self.users.mark_dirty(user_info.user_id)
+        logger.info(f'User {user_info.user_id} purchased {levels} {upgrade_type} upgrade(s) for {price}.')
+        if installed:
+            user_info.computer.upgrade(upgrade_type, levels)
         else:
-            user_info.computer.hardware[upgrade_type] = hardware_stat
+            hardware_stat.upgrade(levels - 1)
+            user_info.computer.install(upgrade_type, hardware_stat)
         return user_info
         
     ### USERS ###
@@ -176,6 +541,12 @@ class TranscodeTycoonGameLogic:
     def hash_token_to_user_id(self, user_token: str) -> str:
         return f'usr{hashlib.sha256(user_token.encode()).hexdigest()[:10]}'
 
+    def get_user_by_token(self, user_token: str) -> UserInfo:
+        user_id = self.hash_token_to_user_id(user_token)
+        if user_id not in self.users:
+            raise ItemNotFoundError('Invalid token')
+        return self.users[user_id]
+
     def create_user(self) -> CreateUserResponse:
         '''
         Creates a new user and a basic computer to get you started.
@@ -198,11 +569,89 @@ class TranscodeTycoonGameLogic:
         )
         return response
     
+    def get_leaderboard_user(self, user_info: UserInfo, rank: int | None = None) -> LeaderboardUser:
+        return LeaderboardUser(
+            rank=rank,
+            user_id=user_info.user_id,
+            username=user_info.username,
+            completed_jobs=len(user_info.completed_jobs),
+            funds=user_info.funds,
+            processing_power=user_info.computer.processing_power,
+            total_revenue=user_info.total_revenue,
+        )
+
+    def get_leaderboard(self, start: int = 0, items: int = 10) -> Leaderboard:
+        '''
+        Ranks every user by total revenue. Paged out users and users that haven't been validated
+        since startup are ranked from their summaries instead of being read in.
+        '''
+        leaderboard_users = []
+        for user_info in self.users.resident_users():
+            self.check_user_jobs(user_info)
+            leaderboard_users.append(self.get_leaderboard_user(user_info))
+        leaderboard_users.extend(self.users.pending_summaries())
+        leaderboard_users.extend(self.users.cold_summaries())
+
+        users_sorted = sorted(leaderboard_users, key=lambda u: u.total_revenue, reverse=True)
+        page = users_sorted[start:start + items]
+        for index, leaderboard_user in enumerate(page):
+            leaderboard_user.rank = index + 1 + start
+        return Leaderboard(total=len(users_sorted), start=start, users=page)
+
+    @property
+    def username_index(self) -> UsernameIndex:
+        if self._username_index is None:
+            self._username_index = UsernameIndex(self.users.usernames())
+        return self._username_index
+
+    def search_usernames(self, prefix: str, start: int = 0, items: int = 10) -> Leaderboard:
+        '''
+        Users whose username starts with `prefix` (case-insensitive), in alphabetical order.
+        Finished jobs are settled first, as they are for the leaderboard.
+        '''
+        total, user_ids = self.username_index.search(prefix, start=start, items=items)
+        users = []
+        for user_id in user_ids:
+            user_info = self.users.peek(user_id)
+            if isinstance(user_info, UserInfo):
+                self.check_user_jobs(user_info)
+                user_info = self.get_leaderboard_user(user_info)
+            users.append(user_info)
+        return Leaderboard(total=total, start=start, users=users)
+
+    def __user_stats_recorder__(self, user_info: UserInfo) -> UserStatsRecorder:
+        recorder = self.user_stats.get(user_info.user_id)
+        if recorder is None:
+            recorder = self.user_stats[user_info.user_id] = UserStatsRecorder()
+            # newest first, stopping once jobs are older than the longest history kept
+            history_cutoff = self.clock.now() - max(width * size for width, size in STATS_RESOLUTIONS.values())
+            for job in reversed(user_info.completed_jobs):
+                if job.estimated_completion_ts < history_cutoff:
+                    break
+                recorder.record_job(job)
+        return recorder
+
+    def get_user_stats(self, user_info: UserInfo, resolutions: list[StatsResolution] | None = None) -> UserStats:
+        '''
+        Revenue, completed jobs and render utilization over time, bucketed by minute, hour and day.
+        '''
+        self.check_user_jobs(user_info)
+        return UserStats(
+            user_id=user_info.user_id,
+            series=self.__user_stats_recorder__(user_info).series(self.clock.now(), resolutions),
+        )
+
     def update_user(self, user_info: UserInfo, user_update: PatchUserInfo) -> UserInfo:
-        update_payload = user_update.model_dump(mode='json', exclude_none=True)
+        # the payload was validated by the route, so only the fields the client sent are copied over
+        update_payload = {
+            field: getattr(user_update, field) for field in user_update.model_fields_set
+            if getattr(user_update, field) is not None
+        }
         logger.info(f'Updating user {user_info.user_id} with payload: {update_payload}')
         for k, v in update_payload.items():
             user_info.__setattr__(k, v)
+        self.users.mark_dirty(user_info.user_id)
+        self.username_index.update(user_info.user_id, user_info.username)
         return self.get_user(user_info.user_id)
 
     ### JOBS ###
@@ -211,24 +660,31 @@ class TranscodeTycoonGameLogic:
         deletes all jobs where the creation timestamp is <= cutoff timestamp
         '''
         if cutoff_timestamp is None:
-            cutoff_timestamp = datetime.now() - self.purge_old_job_timedelta
+            cutoff_timestamp = self.clock.now() - self.purge_old_job_timedelta
         # drop jobs older than 6 hours ago
         pruned_jobs = {}
         for k, v in self.jobs.items():
             if v._creation_ts > cutoff_timestamp:
                 pruned_jobs[k] = v
         logger.info(f'Dropping {len(self.jobs) - len(pruned_jobs)} old jobs from the board')
+        if len(pruned_jobs) != len(self.jobs):
+            self.jobs_version += 1
         self.jobs = pruned_jobs
 
     def check_user_jobs(self, user_info: UserInfo) -> None:
         '''
-        Iterates through the user's job queue and checks for completed tasks
+        Iterates through the user's job queue and checks for completed tasks. Changes are
+        persisted by the next flush.
         '''
+        now = self.clock.now()
         for job in user_info.job_queue:
-            if job.estimated_completion_ts < datetime.now():
+            if job.estimated_completion_ts < now:
+                # recorded before the job joins completed_jobs so a backfill doesn't count it twice
+                self.__user_stats_recorder__(user_info).record_job(job)
                 job.status = JobStatus.COMPLETED
                 user_info.completed_jobs.append(job)
                 user_info.funds += job.payout
+                self.users.mark_dirty(user_info.user_id)
                 logger.info(f'{job.job_id} marked complete. Payout: ${job.payout}')
         # remove completed jobs from queue
         user_info.job_queue = [
@@ -240,34 +696,99 @@ class TranscodeTycoonGameLogic:
                 job.status = JobStatus.IN_PROGRESS
             else:
                 job.status = JobStatus.QUEUED
-        self.__dump_state__()
+
+    def delete_job(self, user_info: UserInfo, job_id: str) -> UserInfo:
+        '''
+        Deletes a job from the user's queue and pushes the completion time of all other jobs up (plus a tiny time penalty).
+        '''
+        found_job = False
+        shortened_queue: list[JobInfoQueued] = []
+        offset = timedelta(seconds=0)
+
+        for job in user_info.job_queue:
+            if job.job_id == job_id:
+                found_job = True
+                offset = timedelta(seconds=job.render_time_seconds + 5)
+            else:
+                job.estimated_completion_ts -= offset
+                shortened_queue.append(job)
+
+        if not found_job:
+            raise ItemNotFoundError(f'Unable to find a job with ID {job_id} in user job queue.')
+        user_info.job_queue = shortened_queue
+        self.users.mark_dirty(user_info.user_id)
+        self.check_user_jobs(user_info)
+        return user_info
 
     def __left_weighted_trt__(self, min_value: int = 30, max_value: int = 7200) -> float:
         alpha, beta = 1, 6
-        beta_samples = np.random.beta(alpha, beta, 1)
+        beta_samples = self.np_random.beta(alpha, beta, 1)
         scaled_samples = min_value + beta_samples * (max_value - min_value)
         return round(scaled_samples[0], 1)
 
     def generate_random_job(self) -> JobInfo:
-        job_id = f'ren{uuid4().hex[:8]}'
+        job_id = f'ren{self.random.getrandbits(32):08x}'
         job = JobInfo(
             job_id=job_id,
             status=JobStatus.AVAILABLE,
             total_run_time=self.__left_weighted_trt__(),
-            priority=choice(list(Priority)),
-            format=choice(list(Format))
+            priority=self.random.choice(list(Priority)),
+            format=self.random.choice(list(Format))
         )
+        job._creation_ts = self.clock.now()
         return job
     
-    def create_new_jobs(self) -> None:
-        available_capacity = self.job_capacity - len(self.jobs)
-        if available_capacity > 0:
-            for _ in range(available_capacity):
-                new_job = self.generate_random_job()
-                self.add_job(new_job)
-            logger.info(f'Generated {available_capacity} new jobs.')
-        else:
-            logger.info(f'No new jobs created. Job board at maximum capacity.')
+    def refill_job_board(self) -> int:
+        '''
+        Prunes stale jobs and tops the board back up to capacity from the pre-generated reserve,
+        then regenerates the reserve. Returns the number of jobs added to the board.
+        '''
+        self.prune_available_jobs()
+        added_jobs = 0
+        while len(self.jobs) < self.job_capacity:
+            job = self.job_reserve.pop() if self.job_reserve else self.generate_random_job()
+            # jobs only start aging once they're on the board
+            job._creation_ts = self.clock.now()
+            self.add_job(job)
+            added_jobs += 1
+        while len(self.job_reserve) < self.job_capacity:
+            self.job_reserve.append(self.generate_random_job())
+        if added_jobs:
+            logger.info(f'Refilled job board with {added_jobs} jobs.')
+        return added_jobs
+
+    async def refill_job_board_continuously(self, prune_interval_seconds: float = 60.0) -> None:
+        '''
+        Background task that refills the job board `job_refill_latency` seconds after a claim,
+        and prunes it at least every `prune_interval_seconds`. Keeps `GET /jobs/` a pure read.
+        '''
+        while True:
+            try:
+                await asyncio.wait_for(self._job_board_claimed.wait(), timeout=prune_interval_seconds)
+                await asyncio.sleep(self.job_refill_latency)
+            except TimeoutError:
+                pass
+            self._job_board_claimed.clear()
+            try:
+                self.refill_job_board()
+            except Exception:
+                logger.exception('Failed to refill the job board, retrying on the next run')
+
+    @property
+    def job_board_etag(self) -> str:
+        return f'W/"{self.jobs_epoch}-{self.jobs_version}"'
+
+    def get_job_board_json(self) -> bytes:
+        '''
+        All available jobs sorted by `job_id`, serialized once per job board version.
+        '''
+        if self._job_board_cache is None or self._job_board_cache[0] != self.jobs_version:
+            jobs = sorted(
+                (j for j in self.jobs.values() if j.status == JobStatus.AVAILABLE),
+                key=lambda j: j.job_id
+            )
+            self._job_board_cache = (self.jobs_version, job_board_adapter.dump_json(jobs))
+        return self._job_board_cache[1]
 
     def get_job(self, job_id: str) -> JobInfo:
         job = self.jobs.get(job_id)
@@ -277,6 +798,7 @@ class TranscodeTycoonGameLogic:
         
     def add_job(self, job_data: JobInfo) -> None:
         self.jobs[job_data.job_id] = job_data
+        self.jobs_version += 1
         logger.debug(f"Added job with ID {job_data.job_id}")
 
     def claim_job(self, job_id: str, user_info: UserInfo) -> None:
@@ -289,23 +811,100 @@ class TranscodeTycoonGameLogic:
             job = self.jobs.pop(job_id)
         except KeyError:
             raise ItemNotFoundError(f'Job ID not found or has already been claimed: {job_id}')
+        self.jobs_version += 1
+        self._job_board_claimed.set()
 
         estimated_render_time = self.__calculate_completion_timedelta__(
             job_info=job,
             computer_info=user_info.computer)
         if len(user_info.job_queue) == 0:
             job.status = JobStatus.IN_PROGRESS
-            job_completion_ts = datetime.now() + timedelta(seconds=estimated_render_time)
+            job_completion_ts = self.clock.now() + timedelta(seconds=estimated_render_time)
         else:
             job.status = JobStatus.QUEUED
             job_completion_ts = user_info.job_queue[-1].estimated_completion_ts + timedelta(seconds=estimated_render_time)
+        # built from the board job's attributes rather than a dump. see benchmarks/construction.py
+        # for why this isn't a model_construct
         queued_job = JobInfoQueued(
-            **job.model_dump(),
+            **{field: getattr(job, field) for field in JobInfo.model_fields},
             estimated_completion_ts=job_completion_ts,
             render_time_seconds=estimated_render_time,
         )
         user_info.job_queue.append(queued_job)
+        self.users.mark_dirty(user_info.user_id)
         logger.debug(f"User {user_info.user_id} registered job {queued_job.job_id}")
 
-
-game_logic = TranscodeTycoonGameLogic()
+    ### EXPORTS ###
+    async def export_snapshot(self, leaderboard_size: int = 100) -> Iterator[bytes]:
+        '''
+        Takes a point-in-time snapshot of the game and returns it as an NDJSON stream: a
+        `snapshot` header, the top `leaderboard_size` leaderboard rows, then every user
+        followed by one line per completed job.
+
+        Awaiting this flushes the dirty shards and opens the shard files; shards are replaced
+        rather than rewritten, so the open handles keep reading this snapshot while the game
+        moves on. The returned iterator does the reading and encoding
+        one shard (or paged out user) at a time and is safe to consume from a worker thread.
+        '''
+        if self.disable_backups:
+            raise PersistenceDisabledError('Exports are read from persisted state, which is disabled')
+        async with self._flush_lock:
+            # settles finished jobs, which the flush then persists along with everything else.
+            # nothing else runs between here and the start of the flush
+            leaderboard = self.get_leaderboard(start=0, items=leaderboard_size)
+            cold_user_ids = self.users.cold_user_ids()
+            await self.__flush_state__()
+            # snapshot files are never rewritten, only deleted, so open handles keep reading this version
+            shard_files = [open(self._current_snapshots[shard], 'rb') for shard in sorted(self._current_snapshots)]
+            with self._exports_lock:
+                self._open_exports += 1
+        header = {
+            'type': 'snapshot',
+            'created_ts': self.clock.now().isoformat(),
+            'total_users': leaderboard.total,
+        }
+        records = self.__export_records__(header, leaderboard, shard_files, cold_user_ids)
+        # started right away so the files are closed and the export released even if the stream is never read
+        records = chain([next(records)], records)
+        return (json.dumps(record, separators=(',', ':')).encode() + b'\n' for record in records)
+
+    def __export_records__(
+            self,
+            header: dict[str, Any],
+            leaderboard: Leaderboard,
+            shard_files: list[BinaryIO],
+            cold_user_ids: list[str],
+        ) -> Iterator[dict[str, Any]]:
+        try:
+            yield header
+            for leaderboard_user in leaderboard.users:
+                yield {'type': 'leaderboard', **leaderboard_user.model_dump(mode='json')}
+            for user_data in self.__snapshot_users__(shard_files, cold_user_ids):
+                completed_jobs = user_data.pop('completed_jobs')
+                yield {'type': 'user', **user_data}
+                for job in completed_jobs:
+                    yield {'type': 'completed_job', 'user_id': user_data['user_id'], **job}
+        finally:
+            for shard_file in shard_files:
+                shard_file.close()
+            with self._exports_lock:
+                self._open_exports -= 1
+
+    def __snapshot_users__(self, shard_files: list[BinaryIO], cold_user_ids: list[str]) -> Iterator[dict[str, Any]]:
+        for shard_file in shard_files:
+            yield from decode_snapshot(shard_file.read())[1].values()
+            shard_file.close()
+        # page files are also replaced atomically, and not deleted while an export is open. a
+        # user paged in and out again during the export shows up with their newer state
+        for user_id in cold_user_ids:
+            user_data = self.users.read_page(user_id)
+            if user_data is not None:
+                yield user_data
+
+
+game_logic = TranscodeTycoonGameLogic(
+    job_refill_latency=float(getenv('TRANSCODE_TYCOON_JOB_REFILL_SECONDS', '0.5')),
+    shard_count=int(getenv('TRANSCODE_TYCOON_STATE_SHARDS', '16')),
+    user_idle_timeout=timedelta(minutes=float(getenv('TRANSCODE_TYCOON_USER_IDLE_MINUTES', '60'))),
+    flush_interval=float(getenv('TRANSCODE_TYCOON_FLUSH_SECONDS', '5')),
+)
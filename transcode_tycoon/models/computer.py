@@ -1,5 +1,7 @@
 from enum import StrEnum
 
+from transcode_tycoon.models.jobs import Format, FORMAT_MEGAPIXELS_PER_SECOND
+
 from pydantic import BaseModel, Field, computed_field
 
 
@@ -15,12 +17,34 @@ class HardwareStats(BaseModel):
     upgrade_price: float = 50.0
     max_level: int
 
-    def upgrade(self) -> None:
-        if self.current_level + 1 > self.max_level:
+    @property
+    def remaining_levels(self) -> int:
+        return self.max_level - self.current_level
+
+    def level_prices(self, levels: int) -> list[float]:
+        '''
+        Price of each of the next `levels` upgrades, in purchase order.
+        '''
+        # every upgrade raises the price by 50 * the new level
+        return [
+            round(self.upgrade_price + 50 * (i * self.current_level + i * (i + 1) / 2), 2)
+            for i in range(levels)
+        ]
+
+    def price_of_levels(self, levels: int) -> float:
+        '''
+        Total price of the next `levels` upgrades, in closed form: the sum of `level_prices(levels)`.
+        '''
+        n = levels
+        return round(n * self.upgrade_price + 25 * self.current_level * n * (n - 1) + 25 * (n - 1) * n * (n + 1) / 3, 2)
+
+    def upgrade(self, levels: int = 1) -> None:
+        if self.current_level + levels > self.max_level:
             raise MaxUpgradesReached(' Maximum upgrades reached for this hardware type.')
-        self.current_level += 1
-        self.value += self.upgrade_increment
-        self.upgrade_price = round((50 * self.current_level) + self.upgrade_price, 2)
+        self.upgrade_price = round(
+            self.upgrade_price + 50 * (levels * self.current_level + levels * (levels + 1) / 2), 2)
+        self.current_level += levels
+        self.value += self.upgrade_increment * levels
 
 class HardwareType(StrEnum):
     CPU_CORES = "CPU_CORES"
@@ -31,19 +55,62 @@ class HardwareType(StrEnum):
 class ComputerInfo(BaseModel):
     hardware: dict[HardwareType, HardwareStats] = Field(default_factory=dict)
 
+    def install(self, hardware_type: HardwareType, hardware_stat: HardwareStats) -> None:
+        self.hardware[hardware_type] = hardware_stat
+
+    def upgrade(self, hardware_type: HardwareType, levels: int = 1) -> None:
+        '''
+        Upgrades installed hardware.
+        '''
+        self.hardware[hardware_type].upgrade(levels)
+
+    def __cached_stats__(self) -> tuple[float, dict[Format, float]]:
+        '''
+        Processing power and render rates. Cached alongside the hardware values they were
+        computed from, so any change to the hardware, however it's made, recomputes them.
+        '''
+        hardware_values = tuple((hardware_type, stat.value) for hardware_type, stat in self.hardware.items())
+        # kept out of the model fields so it's never dumped or compared
+        cached_stats = self.__dict__.get('_cached_stats')
+        if cached_stats is None or cached_stats[0] != hardware_values:
+            # 1Hz == 1 pixel calculated
+            # 1 core cpu * 1Ghz = 1mbps
+            # 2 cores * 2Ghz = 4mbps
+            power = 1
+            for value in [HardwareType.CPU_CORES, HardwareType.CLOCK_SPEED]:
+                if value in self.hardware.keys():
+                    power *= self.hardware[value].value
+            if HardwareType.GPU in self.hardware:
+                power *= self.hardware[HardwareType.GPU].value
+            render_rates = {
+                video_format: megapixels / power
+                for video_format, megapixels in FORMAT_MEGAPIXELS_PER_SECOND.items()
+            }
+            cached_stats = self.__dict__['_cached_stats'] = (hardware_values, power, render_rates)
+        return cached_stats[1], cached_stats[2]
+
     @computed_field
     @property
     def processing_power(self) -> float:
-        # 1Hz == 1 pixel calculated
-        # 1 core cpu * 1Ghz = 1mbps
-        # 2 cores * 2Ghz = 4mbps
-        power = 1
-        for value in [HardwareType.CPU_CORES, HardwareType.CLOCK_SPEED]:
-            if value in self.hardware.keys():
-                power *= self.hardware[value].value
-        if HardwareType.GPU in self.hardware:
-            power *= self.hardware[HardwareType.GPU].value
-        return power
+        return self.__cached_stats__()[0]
+
+    @property
+    def render_seconds_per_second(self) -> dict[Format, float]:
+        '''
+        Seconds this computer needs to render one second of video in each format.
+        '''
+        return self.__cached_stats__()[1]
+
+
+class UpgradePriceProjection(BaseModel):
+    upgrade_type: HardwareType
+    current_level: int
+    max_level: int
+    # price of each upgrade level and the running total for buying up to that level
+    level_prices: list[float]
+    cumulative_prices: list[float]
+    max_affordable_levels: int
+
 
 class UpgradePayload(BaseModel):
     upgrade_type: HardwareType
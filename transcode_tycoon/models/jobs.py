@@ -1,5 +1,6 @@
 
 from datetime import datetime
+from functools import cached_property
 from uuid import uuid4
 
 from pydantic import BaseModel, computed_field, Field, PrivateAttr
@@ -26,6 +27,33 @@ class Priority(StrEnum):
     HIGH = "high"
 
 
+FORMAT_PIXELS = {
+    Format.UHD: 3840 * 2160,
+    Format.FHD: 1920 * 1080,
+    Format.HD: 1280 * 720,
+    Format.SD: 720 * 480
+}
+
+# megapixels rendered per second of video, assuming 30 fps
+FORMAT_MEGAPIXELS_PER_SECOND = {
+    k: (v * 30) / 1_000_000 for k, v in FORMAT_PIXELS.items()
+}
+
+# base rate $ per minute of video
+FORMAT_BASE_RATE = {
+    Format.UHD: 10.0,
+    Format.FHD: 5.0,
+    Format.HD: 2.5,
+    Format.SD: 1.0
+}
+
+PRIORITY_MULTIPLIER = {
+    Priority.LOW: 1.0,
+    Priority.MEDIUM: 1.5,
+    Priority.HIGH: 2.0
+}
+
+
 class JobInfo(BaseModel):
     job_id: str = Field(default=f'rend{uuid4().hex[:8]}')
     status: JobStatus
@@ -34,24 +62,11 @@ class JobInfo(BaseModel):
     format: Format
     _creation_ts: datetime = PrivateAttr(default_factory=datetime.now)
 
+    # payout is read on every serialization and revenue total, so it's only calculated once
     @computed_field
-    @property
+    @cached_property
     def payout(self) -> float:
-        # base rate $ per minute of video
-        base_rate = {
-            Format.UHD: 10.0,
-            Format.FHD: 5.0,
-            Format.HD: 2.5,
-            Format.SD: 1.0
-        }[self.format]
-
-        priority_multiplier = {
-            Priority.LOW: 1.0,
-            Priority.MEDIUM: 1.5,
-            Priority.HIGH: 2.0
-        }[self.priority]
-
-        return round(base_rate * priority_multiplier * (self.total_run_time / 60), 2)
+        return round(FORMAT_BASE_RATE[self.format] * PRIORITY_MULTIPLIER[self.priority] * (self.total_run_time / 60), 2)
 
 
 class JobInfoQueued(JobInfo):
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from enum import StrEnum
+
+from pydantic import BaseModel
+
+
+class StatsResolution(StrEnum):
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+
+
+# bucket width and how many buckets are kept at each resolution
+STATS_RESOLUTIONS: dict[StatsResolution, tuple[timedelta, int]] = {
+    StatsResolution.MINUTE: (timedelta(minutes=1), 60),
+    StatsResolution.HOUR: (timedelta(hours=1), 48),
+    StatsResolution.DAY: (timedelta(days=1), 30),
+}
+
+
+class StatsBucket(BaseModel):
+    start_ts: datetime
+    revenue: float
+    completed_jobs: int
+    # fraction of the bucket the user's computer spent rendering
+    utilization: float
+
+
+class StatsSeries(BaseModel):
+    resolution: StatsResolution
+    bucket_seconds: int
+    buckets: list[StatsBucket]
+
+
+class UserStats(BaseModel):
+    user_id: str
+    series: list[StatsSeries]
@@ -0,0 +1,36 @@
+import logging
+
+from transcode_tycoon.game_logic import game_logic, PersistenceDisabledError
+from transcode_tycoon.utils.auth import verify_admin_token
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(verify_admin_token)],
+    include_in_schema=False,
+)
+
+
+@router.get("/export")
+async def export_game_state(leaderboard_size: int = Query(default=100, ge=0, le=10_000)) -> StreamingResponse:
+    '''
+    Streams a point-in-time snapshot of every user and their completed jobs as NDJSON, one
+    record per line. Each record has a `type` of `snapshot`, `leaderboard`, `user` or `completed_job`.
+    '''
+    try:
+        records = await game_logic.export_snapshot(leaderboard_size=leaderboard_size)
+    except PersistenceDisabledError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    logger.info('Streaming game state export')
+    # a plain iterator is consumed in the threadpool, so reading shards doesn't block the event loop
+    return StreamingResponse(records, media_type='application/x-ndjson')
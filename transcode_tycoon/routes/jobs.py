@@ -1,13 +1,14 @@
 import logging
 from typing import Optional
-from datetime import timedelta
 
-from transcode_tycoon.models.jobs import JobInfo, JobStatus, JobInfoQueued
+from transcode_tycoon.models.jobs import JobInfo
 from transcode_tycoon.models.users import UserInfo
 from transcode_tycoon.game_logic import game_logic, ItemNotFoundError, InsufficientResources
 from transcode_tycoon.utils.auth import get_current_user
+from transcode_tycoon.utils.responses import PydanticJSONResponse
+from transcode_tycoon.utils.rate_limit import RateLimit, UserRateLimit
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
 
 
 logger = logging.getLogger(__name__)
@@ -17,33 +18,43 @@ router = APIRouter(
     responses={status.HTTP_404_NOT_FOUND: {"description": "Not found"}},
 )
 
+# per-route request budgets
+job_board_rate_limit = RateLimit(requests_per_second=2.0, burst=20)
+claim_rate_limit = UserRateLimit(requests_per_second=10.0, burst=40)
+delete_rate_limit = UserRateLimit(requests_per_second=5.0, burst=20)
 
-@router.get("/")
-async def list_available_jobs(job_id: Optional[str] = None) -> list[JobInfo] | JobInfo:
+
+@router.get("/", response_model=list[JobInfo] | JobInfo, dependencies=[Depends(job_board_rate_limit)])
+async def list_available_jobs(request: Request, job_id: Optional[str] = None) -> Response:
     '''
     Query for a specific job or all available jobs
 
     Default order is alphabetical by `job_id`.
+
+    The job board carries an `ETag`. Send it back in an `If-None-Match` header and you'll get
+    an empty `304 Not Modified` response until the board changes.
     '''
-    game_logic.prune_available_jobs()
-    game_logic.create_new_jobs()
     if job_id:
         try:
-            return game_logic.get_job(job_id)
+            return PydanticJSONResponse(game_logic.get_job(job_id))
         except ItemNotFoundError as e:
             raise HTTPException(
                 status_code=404,
                 detail=str(e)
             )
     else:
-        jobs = sorted(
-            (j for j in game_logic.jobs.values() if j.status == JobStatus.AVAILABLE),
-            key=lambda j: j.job_id
+        etag = game_logic.job_board_etag
+        if_none_match = request.headers.get('if-none-match', '')
+        if etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*':
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(
+            content=game_logic.get_job_board_json(),
+            media_type='application/json',
+            headers={'ETag': etag}
         )
-        return jobs
 
-@router.post("/claim", status_code=status.HTTP_202_ACCEPTED)
-async def claim_job(job_id: str, user_info: UserInfo = Depends(get_current_user)) -> UserInfo:
+@router.post("/claim", status_code=status.HTTP_202_ACCEPTED, response_model=UserInfo, dependencies=[Depends(claim_rate_limit)])
+async def claim_job(job_id: str, user_info: UserInfo = Depends(get_current_user)) -> PydanticJSONResponse:
     '''
     Claims a job for a user if they have enough RAM. 1GB of RAM is equal to 1 job in the queue.
 
@@ -52,7 +63,7 @@ async def claim_job(job_id: str, user_info: UserInfo = Depends(get_current_user)
     try:
         game_logic.claim_job(job_id, user_info)
         game_logic.check_user_jobs(user_info)
-        return user_info
+        return PydanticJSONResponse(user_info, status_code=status.HTTP_202_ACCEPTED)
     except ItemNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,27 +76,15 @@ async def claim_job(job_id: str, user_info: UserInfo = Depends(get_current_user)
         )
 
     
-@router.delete('/delete', status_code=status.HTTP_202_ACCEPTED)
-async def delete_user_job(job_id: str, user_info: UserInfo = Depends(get_current_user)) -> UserInfo:
+@router.delete('/delete', status_code=status.HTTP_202_ACCEPTED, response_model=UserInfo, dependencies=[Depends(delete_rate_limit)])
+async def delete_user_job(job_id: str, user_info: UserInfo = Depends(get_current_user)) -> PydanticJSONResponse:
     '''
     Deletes a job from the user's queue and pushes the completion time of all other jobs up (plus a tiny time penalty).
     '''
-    found_job = False
-    shortened_queue: list[JobInfoQueued] = []
-    offset = timedelta(seconds=0)
-
-    for job in user_info.job_queue:
-        if job.job_id == job_id:
-            found_job = True
-            offset = timedelta(seconds=job.render_time_seconds + 5)
-        else:
-            job.estimated_completion_ts -= offset
-            shortened_queue.append(job)
-    
-    if not found_job:
+    try:
+        return PydanticJSONResponse(game_logic.delete_job(user_info, job_id), status_code=status.HTTP_202_ACCEPTED)
+    except ItemNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f'Unable to find a job with ID {job_id} in user job queue.')
-    user_info.job_queue = shortened_queue
-    game_logic.check_user_jobs(user_info)
-    return user_info
+            detail=str(e)
+        )
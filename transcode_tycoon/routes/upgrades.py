@@ -1,11 +1,13 @@
 import logging
 
-from transcode_tycoon.models.computer import HardwareType, HardwareStats, MaxUpgradesReached
+from transcode_tycoon.models.computer import HardwareType, HardwareStats, MaxUpgradesReached, UpgradePriceProjection
 from transcode_tycoon.models.users import UserInfo
-from transcode_tycoon.game_logic import game_logic, ItemNotFoundError, InsufficientResources
+from transcode_tycoon.game_logic import game_logic, ItemNotFoundError, InsufficientResources, ComputerUpgradeError
 from transcode_tycoon.utils.auth import get_current_user
+from transcode_tycoon.utils.responses import PydanticJSONResponse
+from transcode_tycoon.utils.rate_limit import UserRateLimit
 
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 
 logger = logging.getLogger(__name__)
 
@@ -15,14 +17,29 @@ router = APIRouter(
     responses={status.HTTP_404_NOT_FOUND: {"description": "Not found"}},
 )
 
+# per-route request budgets
+purchase_rate_limit = UserRateLimit(requests_per_second=5.0, burst=20)
+upgrade_info_rate_limit = UserRateLimit(requests_per_second=5.0, burst=20)
 
-@router.post('/purchase')
-async def upgrade_computer(upgrade_type: HardwareType, user_info: UserInfo = Depends(get_current_user)) -> UserInfo:
+
+@router.post('/purchase', response_model=UserInfo, dependencies=[Depends(purchase_rate_limit)])
+async def upgrade_computer(
+    upgrade_type: HardwareType,
+    levels: int = Query(default=1, ge=1),
+    buy_max: bool = False,
+    user_info: UserInfo = Depends(get_current_user)
+) -> PydanticJSONResponse:
+    '''
+    Purchases `levels` upgrades in one go. Set `buy_max` to buy as many levels as you can afford instead.
+
+    Either every requested level is purchased or none are.
+    '''
     try:
-        return game_logic.purchase_upgrade(
+        return PydanticJSONResponse(game_logic.purchase_upgrade(
             user_info=user_info,
-            upgrade_type=upgrade_type
-        )
+            upgrade_type=upgrade_type,
+            levels=None if buy_max else levels
+        ))
     except ItemNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -38,16 +55,27 @@ async def upgrade_computer(upgrade_type: HardwareType, user_info: UserInfo = Dep
             status_code=status.HTTP_403_FORBIDDEN,
             detail=str(e)
         )
-
-@router.get('/list')
-async def get_available_upgrades(user_info: UserInfo = Depends(get_current_user)) -> dict[HardwareType, HardwareStats]:
-    try:
-        user_hardware = user_info.computer.hardware
-        if HardwareType.GPU not in user_info.computer.hardware:
-            user_hardware[HardwareType.GPU] = game_logic.starter_gpu()
-        return user_hardware
-    except ItemNotFoundError as e:
+    except ComputerUpgradeError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
+            status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+@router.get('/prices', response_model=UpgradePriceProjection, dependencies=[Depends(upgrade_info_rate_limit)])
+async def project_upgrade_prices(
+    upgrade_type: HardwareType,
+    levels: int = Query(default=1, ge=1),
+    user_info: UserInfo = Depends(get_current_user)
+) -> PydanticJSONResponse:
+    '''
+    Shows the price of your next `levels` upgrades and how many levels you can currently afford. Nothing is purchased.
+    '''
+    return PydanticJSONResponse(game_logic.project_upgrade_prices(
+        user_info=user_info,
+        upgrade_type=upgrade_type,
+        levels=levels
+    ))
+
+@router.get('/list', response_model=dict[HardwareType, HardwareStats], dependencies=[Depends(upgrade_info_rate_limit)])
+async def get_available_upgrades(user_info: UserInfo = Depends(get_current_user)) -> PydanticJSONResponse:
+    return PydanticJSONResponse(game_logic.list_upgrades(user_info))
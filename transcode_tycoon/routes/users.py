@@ -1,10 +1,13 @@
 import logging
 
 from transcode_tycoon.models.users import UserInfo, Leaderboard, LeaderboardUser, PatchUserInfo
+from transcode_tycoon.models.stats import StatsResolution, UserStats
 from transcode_tycoon.game_logic import game_logic, ItemNotFoundError
 from transcode_tycoon.utils.auth import get_current_user
+from transcode_tycoon.utils.responses import PydanticJSONResponse
+from transcode_tycoon.utils.rate_limit import RateLimit, UserRateLimit
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 
 
 logger = logging.getLogger(__name__)
@@ -16,71 +19,73 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# per-route request budgets
+my_info_rate_limit = UserRateLimit(requests_per_second=5.0, burst=20)
+search_rate_limit = RateLimit(requests_per_second=5.0, burst=20)
+# the leaderboard settles every user's jobs, so it gets the smallest budget
+leaderboard_rate_limit = RateLimit(requests_per_second=0.5, burst=5)
 
-@router.get("/my_info")
-async def get_my_user_info(user_info: UserInfo = Depends(get_current_user)) -> UserInfo:
+
+@router.get("/my_info", response_model=UserInfo, dependencies=[Depends(my_info_rate_limit)])
+async def get_my_user_info(user_info: UserInfo = Depends(get_current_user)) -> PydanticJSONResponse:
     '''
     Returns your user information including your user ID, completed jobs, and total funds.
     '''
     game_logic.check_user_jobs(user_info)
-    return user_info
+    return PydanticJSONResponse(user_info)
 
-@router.patch('/my_info')
+@router.patch('/my_info', response_model=UserInfo, dependencies=[Depends(my_info_rate_limit)])
 async def update_user_info(
     user_update_payload: PatchUserInfo,
     user_info: UserInfo = Depends(get_current_user)
-) -> UserInfo:
-    return game_logic.update_user(
+) -> PydanticJSONResponse:
+    return PydanticJSONResponse(game_logic.update_user(
         user_info=user_info,
         user_update=user_update_payload
-    )
+    ))
+
+@router.get('/my_stats', response_model=UserStats, dependencies=[Depends(my_info_rate_limit)])
+async def get_my_stats(
+    resolution: list[StatsResolution] = Query(default=[]),
+    user_info: UserInfo = Depends(get_current_user)
+) -> PydanticJSONResponse:
+    '''
+    Your revenue, completed jobs and render utilization over time. Returns the last hour by
+    minute, the last 2 days by hour and the last 30 days by day, oldest bucket first.
 
-@router.get('/search/{user_id}')
-async def lookup_user_by_id(user_id: str) -> LeaderboardUser:
+    Pass one or more `resolution` parameters to only get those series.
+    '''
+    return PydanticJSONResponse(game_logic.get_user_stats(user_info, resolution or None))
+
+@router.get('/search', response_model=Leaderboard, dependencies=[Depends(search_rate_limit)])
+async def search_users_by_username(
+    username_prefix: str = Query(min_length=1, max_length=50),
+    start: int = Query(default=0, ge=0),
+    items: int = Query(default=10, ge=1, le=100)
+) -> PydanticJSONResponse:
+    '''
+    Finds users whose username starts with `username_prefix` (case-insensitive), sorted alphabetically.
+    '''
+    return PydanticJSONResponse(game_logic.search_usernames(
+        prefix=username_prefix,
+        start=start,
+        items=items
+    ))
+
+@router.get('/search/{user_id}', response_model=LeaderboardUser, dependencies=[Depends(search_rate_limit)])
+async def lookup_user_by_id(user_id: str) -> PydanticJSONResponse:
     try:
         user_info = game_logic.get_user(user_id)
-        return LeaderboardUser(
-            user_id=user_info.user_id,
-            username=user_info.username,
-            completed_jobs=len(user_info.completed_jobs),
-            funds=user_info.funds,
-            processing_power=user_info.computer.processing_power,
-            total_revenue=user_info.total_revenue,
-        )
+        return PydanticJSONResponse(game_logic.get_leaderboard_user(user_info))
     except ItemNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
 
-@router.get('/leaderboard')
-async def get_leaderboard(start: int = 0, items: int = 10) -> Leaderboard:
+@router.get('/leaderboard', response_model=Leaderboard, dependencies=[Depends(leaderboard_rate_limit)])
+async def get_leaderboard(start: int = 0, items: int = 10) -> PydanticJSONResponse:
     '''
     Returns a simple leaderboard of top users by total funds.
     '''
-    if len(game_logic.users) == 0:
-        return Leaderboard(total=0, users=[])
-    
-    for user in game_logic.users.values():
-        game_logic.check_user_jobs(user)
-
-    users_sorted = sorted(
-        game_logic.users.values(),
-        key=lambda u: u.total_revenue,
-        reverse=True
-    )
-    return Leaderboard(
-        total=len(users_sorted),
-        start=start,
-        users=[
-            LeaderboardUser(
-                rank=index + 1 + start,
-                user_id=user.user_id,
-                username=user.username,
-                completed_jobs=len(user.completed_jobs),
-                funds=user.funds,
-                processing_power=user.computer.processing_power,
-                total_revenue=user.total_revenue,
-            ) for index, user in enumerate(users_sorted[start:start + items])
-        ]
-    )
+    return PydanticJSONResponse(game_logic.get_leaderboard(start=start, items=items))
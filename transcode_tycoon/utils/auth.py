@@ -1,4 +1,7 @@
-from transcode_tycoon.game_logic import game_logic
+from os import getenv
+from secrets import compare_digest
+
+from transcode_tycoon.game_logic import game_logic, ItemNotFoundError
 from transcode_tycoon.models.users import UserInfo
 
 from fastapi import HTTPException, Depends, status
@@ -8,12 +11,27 @@ security = HTTPBearer()
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserInfo:
     """Dependency to validate API token"""
-    token = credentials.credentials
-    user_id = game_logic.hash_token_to_user_id(token)
-    if user_id not in game_logic.users.keys():
+    try:
+        return game_logic.get_user_by_token(credentials.credentials)
+    except ItemNotFoundError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return game_logic.users[user_id]
+
+
+def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> None:
+    """Dependency for admin routes. They're disabled unless TRANSCODE_TYCOON_ADMIN_TOKEN is set"""
+    admin_token = getenv('TRANSCODE_TYCOON_ADMIN_TOKEN')
+    if not admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Admin endpoints are disabled",
+        )
+    if not compare_digest(credentials.credentials.encode(), admin_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,44 @@
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+
+class Clock(ABC):
+    '''
+    Source of the current time for the game logic. Swap in a `VirtualClock` to run
+    simulations and tests faster than real time.
+    '''
+    @abstractmethod
+    def now(self) -> datetime:
+        ...
+
+
+class SystemClock(Clock):
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+class VirtualClock(Clock):
+    '''
+    Starts at `start` and runs `speed` times faster than real time. With the default
+    speed of 0 the clock is frozen and only moves forward through `advance`.
+    '''
+    def __init__(self, start: datetime | None = None, speed: float = 0.0) -> None:
+        self.start = start or datetime.now()
+        self.speed = speed
+        self._real_start = time.monotonic()
+        self._offset = timedelta(seconds=0)
+
+    def now(self) -> datetime:
+        elapsed = timedelta(seconds=(time.monotonic() - self._real_start) * self.speed)
+        return self.start + self._offset + elapsed
+
+    def advance(self, delta: timedelta | float) -> None:
+        '''
+        Jumps the clock forward by a timedelta or a number of seconds.
+        '''
+        if not isinstance(delta, timedelta):
+            delta = timedelta(seconds=delta)
+        if delta < timedelta(seconds=0):
+            raise ValueError(f'The clock can only move forward, got {delta}')
+        self._offset += delta
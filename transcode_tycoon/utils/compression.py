@@ -0,0 +1,130 @@
+import gzip
+import logging
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import zstandard
+
+
+logger = logging.getLogger(__name__)
+
+# bodies this large take tens of milliseconds to compress, so they're moved off the event loop
+THREADPOOL_MIN_BYTES = 256 * 1024
+
+
+def supported_encodings() -> list[str]:
+    '''
+    Content codings this server can produce, most preferred first.
+    '''
+    return ['zstd', 'gzip']
+
+
+def select_encoding(accept_encoding: str, encodings: list[str]) -> str | None:
+    '''
+    Picks the coding from `encodings` with the highest `q` value in an `Accept-Encoding`
+    header. Ties go to the order of `encodings`. `None` means the body is sent as is.
+    '''
+    preferences: dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            preferences[coding.strip().lower()] = quality
+
+    selected, selected_quality = None, 0.0
+    for encoding in encodings:
+        quality = preferences.get(encoding, preferences.get('*', 0.0))
+        if quality > selected_quality:
+            selected, selected_quality = encoding, quality
+    return selected
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'gzip':
+        # mtime=0 keeps the output stable for identical bodies
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    raise ValueError(f'Unsupported content encoding: {encoding}')
+
+
+class CompressionMiddleware:
+    '''
+    Compresses complete response bodies of at least `minimum_size` bytes with the best coding
+    the client accepts.
+
+    Streaming responses (more than one body message) and responses that already have a
+    `Content-Encoding` are passed through untouched, so NDJSON exports still stream.
+
+    Responses with an `ETag` are only compressed once per coding: the compressed body is kept
+    until the same path returns a different `ETag`, so polling an unchanged job board skips
+    compression as well as serialization.
+    '''
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 1024,
+            gzip_level: int = 6,
+            zstd_level: int = 3,
+        ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {'gzip': gzip_level, 'zstd': zstd_level}
+        self.encodings = supported_encodings()
+        # newest compressed body of each path that sent an ETag, by path and coding
+        self._compressed: dict[tuple[str, str], tuple[str, bytes]] = {}
+        logger.info(f'Compressing responses over {minimum_size} bytes with: {", ".join(self.encodings)}')
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get('accept-encoding', ''), self.encodings)
+        response_start: Message | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal response_start
+            if message['type'] == 'http.response.start':
+                # held back until the first body message shows whether the response is worth compressing
+                response_start = message
+                return
+            if message['type'] != 'http.response.body' or response_start is None:
+                await send(message)
+                return
+
+            start_message, response_start = response_start, None
+            body = message.get('body', b'')
+            headers = MutableHeaders(raw=start_message.setdefault('headers', []))
+            if message.get('more_body', False) or 'content-encoding' in headers or len(body) < self.minimum_size:
+                await send(start_message)
+                await send(message)
+                return
+
+            headers.add_vary_header('Accept-Encoding')
+            if encoding is not None:
+                etag = headers.get('etag')
+                cache_key = (scope['path'], encoding)
+                cached = self._compressed.get(cache_key)
+                if etag is not None and cached is not None and cached[0] == etag:
+                    body = cached[1]
+                elif len(body) >= THREADPOOL_MIN_BYTES:
+                    body = await run_in_threadpool(compress, body, encoding, self.levels[encoding])
+                else:
+                    body = compress(body, encoding, self.levels[encoding])
+                if etag is not None:
+                    self._compressed[cache_key] = (etag, body)
+                headers['Content-Encoding'] = encoding
+                headers['Content-Length'] = str(len(body))
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,43 @@
+import json
+import os
+from os import path, replace
+from tempfile import NamedTemporaryFile
+from typing import Any
+
+
+def fsync_dir(dir_path: str) -> None:
+    '''
+    Flushes a directory entry to disk so a rename into it survives a crash. Not supported on Windows.
+    '''
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    dir_fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def write_bytes_atomic(file_path: str, data: bytes, sync_dir: bool = True) -> None:
+    '''
+    Writes `data` to a temporary file next to `file_path`, flushes it to disk, then swaps it
+    into place.
+
+    Readers only ever see the old file or the new one, never a partial write, and file handles
+    opened on the old file keep reading the old contents. Leftover `.tmp` files mean a crash
+    happened mid-write and are safe to delete.
+
+    Pass `sync_dir=False` when writing a batch of files into one directory, and call `fsync_dir`
+    once after the last of them.
+    '''
+    with NamedTemporaryFile('wb', dir=path.dirname(file_path), suffix='.tmp', delete=False) as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    replace(tmp_file.name, file_path)
+    if sync_dir:
+        fsync_dir(path.dirname(file_path))
+
+
+def write_json_atomic(file_path: str, data: Any, sync_dir: bool = True, **dump_kwargs: Any) -> None:
+    write_bytes_atomic(file_path, json.dumps(data, **dump_kwargs).encode(), sync_dir=sync_dir)
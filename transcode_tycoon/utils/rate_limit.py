@@ -0,0 +1,71 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from transcode_tycoon.models.users import UserInfo
+from transcode_tycoon.utils.auth import get_current_user
+
+from fastapi import HTTPException, Depends, Request, status
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimit:
+    '''
+    Route dependency that gives every client a token bucket holding up to `burst` requests,
+    refilled at `requests_per_second`. Unauthenticated routes key clients by IP address.
+
+    Buckets are kept in LRU order and the least recently seen client is dropped once
+    `max_clients` is reached, so bookkeeping is O(1) per request with bounded memory.
+    '''
+    def __init__(self, requests_per_second: float, burst: int, max_clients: int = 10_000) -> None:
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_clients = max_clients
+        # client key -> (tokens left, monotonic timestamp of the last refill)
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        '''
+        Takes a token from the client's bucket. Returns 0 when the request is allowed,
+        otherwise the number of seconds until a token is available.
+        '''
+        now = time.monotonic()
+        if key in self.buckets:
+            tokens, last_refill = self.buckets.pop(key)
+            tokens = min(self.burst, tokens + (now - last_refill) * self.requests_per_second)
+        else:
+            tokens = self.burst
+            if len(self.buckets) >= self.max_clients:
+                self.buckets.popitem(last=False)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / self.requests_per_second
+        self.buckets[key] = (tokens, now)
+        return retry_after
+
+    def check(self, key: str) -> None:
+        retry_after = self.acquire(key)
+        if retry_after > 0:
+            logger.info(f'Rate limited {key} for {retry_after:.2f} seconds')
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f'Too many requests. Try again in {retry_after:.2f} seconds.',
+                headers={'Retry-After': str(math.ceil(retry_after))},
+            )
+
+    async def __call__(self, request: Request) -> None:
+        self.check(f'ip:{request.client.host if request.client else "unknown"}')
+
+
+class UserRateLimit(RateLimit):
+    '''
+    `RateLimit` keyed by the user resolved from the request's token.
+    '''
+    async def __call__(self, user_info: UserInfo = Depends(get_current_user)) -> None:
+        self.check(user_info.user_id)
@@ -0,0 +1,205 @@
+'''
+Replays request traces recorded by `TraceRecorderMiddleware` against a fresh, seeded
+`TranscodeTycoonGameLogic` persisting to its own state directory. See `benchmarks/replay.py`
+for the command line tool.
+
+Game time always follows the trace on a `VirtualClock`, so renders finish when they did
+originally. Each request looks its user up by token the way `get_current_user` does, calls
+the same game logic as its route, and serializes the response. Traces are anonymized, so
+requests aimed at a specific job or user pick one from the replayed state with a seeded RNG.
+Requests the API rejected before reaching the game (auth, validation and rate limits) are
+skipped.
+'''
+import json
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from random import Random
+
+from pydantic_core import to_json
+
+from transcode_tycoon.game_logic import (
+    TranscodeTycoonGameLogic, ItemNotFoundError, NoJobsInQueueError, ComputerUpgradeError, InsufficientResources
+)
+from transcode_tycoon.models.computer import HardwareType, MaxUpgradesReached
+from transcode_tycoon.models.stats import StatsResolution
+from transcode_tycoon.models.users import PatchUserInfo, UserInfo
+from transcode_tycoon.utils.clock import VirtualClock
+
+
+# rejected before any game logic ran. a 403 is also a missing token when there's no user
+SKIPPED_STATUSES = {401, 422, 429}
+GAME_ERRORS = (ItemNotFoundError, NoJobsInQueueError, ComputerUpgradeError, InsufficientResources, MaxUpgradesReached)
+
+
+def first_param(params: dict[str, list[str | None]], key: str) -> str | None:
+    values = params.get(key)
+    return values[0] if values else None
+
+
+class TraceReplay:
+    def __init__(self, state_dir: str, seed: int = 0, start: datetime = datetime(2025, 1, 1)) -> None:
+        self.start = start
+        self.clock = VirtualClock(start=start)
+        self.game_logic = TranscodeTycoonGameLogic(state_dir=state_dir, clock=self.clock, seed=seed)
+        self.game_logic.refill_job_board()
+        self.random = Random(seed)
+        # token of each user alias in the trace
+        self.tokens: dict[str, str] = {}
+        # registered during the replay but not yet tied to a user alias from the trace
+        self.unbound_tokens: list[str] = []
+        # kept up to date on registration, so picking a user doesn't cost a pass over every user
+        self.user_ids = list(self.game_logic.users)
+        self.refill_due: datetime | None = None
+        self.flush_due = start + timedelta(seconds=self.game_logic.flush_interval)
+        # milliseconds spent in each background state flush
+        self.flushes: list[float] = []
+        self.errors: dict[str, int] = defaultdict(int)
+        self.skipped = 0
+        self.handlers: dict[tuple[str, str], Callable[[UserInfo | None, dict[str, list]], bytes]] = {
+            ('GET', '/'): lambda user, params: b'{}',
+            ('POST', '/register'): self.register,
+            ('GET', '/users/my_info'): self.my_info,
+            ('PATCH', '/users/my_info'): self.update_username,
+            ('GET', '/users/my_stats'): self.my_stats,
+            ('GET', '/users/search'): self.search_usernames,
+            ('GET', '/users/search/{user_id}'): self.lookup_user,
+            ('GET', '/users/leaderboard'): self.leaderboard,
+            ('GET', '/jobs/'): self.list_jobs,
+            ('POST', '/jobs/claim'): self.claim_job,
+            ('DELETE', '/jobs/delete'): self.delete_job,
+            ('GET', '/upgrades/list'): self.list_upgrades,
+            ('GET', '/upgrades/prices'): self.upgrade_prices,
+            ('POST', '/upgrades/purchase'): self.purchase_upgrade,
+        }
+
+    def token(self, alias: str | None) -> str | None:
+        if alias is None:
+            return None
+        if alias not in self.tokens:
+            # the first request carrying a token belongs to the oldest registration without one
+            self.tokens[alias] = self.unbound_tokens.pop(0) if self.unbound_tokens else self.__create_user__()
+        return self.tokens[alias]
+
+    def __create_user__(self) -> str:
+        response = self.game_logic.create_user()
+        self.user_ids.append(response.user_info.user_id)
+        return response.token
+
+    def advance_to(self, t: float) -> None:
+        '''
+        Moves game time to `t` seconds into the trace and runs the job board refill and state
+        flush the background tasks would have run by then. Neither is included in the request
+        latencies.
+        '''
+        target = self.start + timedelta(seconds=t)
+        if target > self.clock.now():
+            self.clock.advance(target - self.clock.now())
+        if self.refill_due is not None and self.clock.now() >= self.refill_due:
+            self.game_logic.refill_job_board()
+            self.refill_due = None
+        if self.clock.now() >= self.flush_due:
+            self.flush()
+            self.flush_due = self.clock.now() + timedelta(seconds=self.game_logic.flush_interval)
+
+    def flush(self) -> None:
+        start = time.perf_counter()
+        self.game_logic.__dump_state__()
+        self.flushes.append((time.perf_counter() - start) * 1000)
+
+    ### ROUTES ###
+    def register(self, user: UserInfo | None, params: dict) -> bytes:
+        response = self.game_logic.create_user()
+        self.user_ids.append(response.user_info.user_id)
+        self.unbound_tokens.append(response.token)
+        return to_json(response)
+
+    def my_info(self, user: UserInfo, params: dict) -> bytes:
+        self.game_logic.check_user_jobs(user)
+        return to_json(user)
+
+    def update_username(self, user: UserInfo, params: dict) -> bytes:
+        return to_json(self.game_logic.update_user(user, PatchUserInfo(username=f'player-{user.user_id[-6:]}')))
+
+    def my_stats(self, user: UserInfo, params: dict) -> bytes:
+        resolutions = [StatsResolution(resolution) for resolution in params.get('resolution', [])]
+        return to_json(self.game_logic.get_user_stats(user, resolutions or None))
+
+    def search_usernames(self, user: UserInfo | None, params: dict) -> bytes:
+        return to_json(self.game_logic.search_usernames(
+            'player', start=int(first_param(params, 'start') or 0), items=int(first_param(params, 'items') or 10)))
+
+    def lookup_user(self, user: UserInfo | None, params: dict) -> bytes:
+        user_info = self.game_logic.get_user(self.random.choice(self.user_ids))
+        return to_json(self.game_logic.get_leaderboard_user(user_info))
+
+    def leaderboard(self, user: UserInfo | None, params: dict) -> bytes:
+        return to_json(self.game_logic.get_leaderboard(
+            start=int(first_param(params, 'start') or 0), items=int(first_param(params, 'items') or 10)))
+
+    def list_jobs(self, user: UserInfo | None, params: dict) -> bytes:
+        if 'job_id' in params:
+            return to_json(self.game_logic.get_job(self.random.choice(list(self.game_logic.jobs) or ['missing'])))
+        return self.game_logic.get_job_board_json()
+
+    def claim_job(self, user: UserInfo, params: dict) -> bytes:
+        job_id = self.random.choice(list(self.game_logic.jobs) or ['missing'])
+        self.game_logic.claim_job(job_id, user)
+        self.game_logic.check_user_jobs(user)
+        if self.refill_due is None:
+            self.refill_due = self.clock.now() + timedelta(seconds=self.game_logic.job_refill_latency)
+        return to_json(user)
+
+    def delete_job(self, user: UserInfo, params: dict) -> bytes:
+        job_id = self.random.choice([j.job_id for j in user.job_queue] or ['missing'])
+        return to_json(self.game_logic.delete_job(user, job_id))
+
+    def list_upgrades(self, user: UserInfo, params: dict) -> bytes:
+        return to_json(self.game_logic.list_upgrades(user))
+
+    def upgrade_prices(self, user: UserInfo, params: dict) -> bytes:
+        return to_json(self.game_logic.project_upgrade_prices(
+            user, HardwareType(first_param(params, 'upgrade_type')), int(first_param(params, 'levels') or 1)))
+
+    def purchase_upgrade(self, user: UserInfo, params: dict) -> bytes:
+        levels = None if first_param(params, 'buy_max') in ('true', '1') else int(first_param(params, 'levels') or 1)
+        return to_json(self.game_logic.purchase_upgrade(user, HardwareType(first_param(params, 'upgrade_type')), levels))
+
+    ### REPLAY ###
+    def replay(self, records: list[dict], speed: float | None = None) -> dict[str, list[float]]:
+        '''
+        Replays `records` in order and returns the latencies in milliseconds for each route.
+        '''
+        latencies: dict[str, list[float]] = defaultdict(list)
+        wall_start = time.perf_counter()
+        for record in records:
+            handler = self.handlers.get((record['method'], record['route']))
+            unauthenticated = record['status'] == 403 and record['user'] is None
+            if handler is None or record['status'] in SKIPPED_STATUSES or unauthenticated:
+                self.skipped += 1
+                continue
+            if speed:
+                time.sleep(max(0.0, wall_start + record['t'] / speed - time.perf_counter()))
+            self.advance_to(record['t'])
+            token = self.token(record['user'])
+
+            route = f'{record["method"]} {record["route"]}'
+            start = time.perf_counter()
+            try:
+                user = self.game_logic.get_user_by_token(token) if token else None
+                handler(user, record['params'])
+            except GAME_ERRORS:
+                self.errors[route] += 1
+            latencies[route].append((time.perf_counter() - start) * 1000)
+        # the flush on shutdown
+        self.flush()
+        return latencies
+
+
+def read_trace(trace_file: str) -> list[dict]:
+    '''
+    Records of a trace in the order their requests started. They're written as requests finish.
+    '''
+    with open(trace_file, 'r') as trace:
+        return sorted((json.loads(line) for line in trace if line.strip()), key=lambda record: record['t'])
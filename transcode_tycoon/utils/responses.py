@@ -0,0 +1,16 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class PydanticJSONResponse(JSONResponse):
+    '''
+    Serializes pydantic models (or lists and dicts of them) straight to JSON bytes with pydantic-core.
+
+    Routes return this directly and declare their model with `response_model=` for the docs.
+    FastAPI passes a returned `Response` through untouched, so the model isn't dumped to a dict,
+    re-validated and encoded a second time.
+    '''
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -0,0 +1,58 @@
+import json
+import zlib
+from typing import Any
+
+
+# bumped whenever the snapshot layout changes
+SNAPSHOT_FORMAT = 1
+
+
+class SnapshotCorruptedError(Exception):
+    pass
+
+
+def encode_json_object(items: dict[str, Any]) -> bytes:
+    '''
+    JSON object of `items`. `bytes` values are taken to be encoded JSON already and are
+    spliced in as they are.
+    '''
+    return b'{' + b', '.join(
+        json.dumps(key).encode() + b': ' + (value if isinstance(value, bytes) else json.dumps(value).encode())
+        for key, value in items.items()
+    ) + b'}'
+
+
+def encode_snapshot(payload: Any, **metadata: Any) -> bytes:
+    '''
+    A one-line JSON header followed by the JSON payload. The header carries `metadata`
+    plus the payload's length and CRC-32, so torn or corrupted writes can be detected
+    without trusting the payload. Dict payloads may hold pre-encoded values, see
+    `encode_json_object`.
+    '''
+    body = encode_json_object(payload) if isinstance(payload, dict) else json.dumps(payload).encode()
+    header = {'format': SNAPSHOT_FORMAT, **metadata, 'length': len(body), 'crc32': zlib.crc32(body)}
+    return json.dumps(header).encode() + b'\n' + body
+
+
+def decode_snapshot(data: bytes) -> tuple[dict[str, Any], Any]:
+    '''
+    Returns the header and payload of an encoded snapshot. Raises `SnapshotCorruptedError`
+    if the snapshot is truncated, fails its checksum or has an unknown format.
+    '''
+    header_line, _, body = data.partition(b'\n')
+    try:
+        header = json.loads(header_line)
+    except ValueError as e:
+        raise SnapshotCorruptedError('Unreadable snapshot header') from e
+    if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotCorruptedError(f'Unsupported snapshot format: {header}')
+    if len(body) != header.get('length'):
+        raise SnapshotCorruptedError(f'Snapshot is {len(body)} bytes, expected {header.get("length")}')
+    if zlib.crc32(body) != header.get('crc32'):
+        raise SnapshotCorruptedError('Snapshot failed its checksum')
+    return header, json.loads(body)
+
+
+def read_snapshot(file_path: str) -> tuple[dict[str, Any], Any]:
+    with open(file_path, 'rb') as snapshot_file:
+        return decode_snapshot(snapshot_file.read())
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from transcode_tycoon.models.jobs import JobInfoQueued
+from transcode_tycoon.models.stats import STATS_RESOLUTIONS, StatsBucket, StatsResolution, StatsSeries
+
+
+class RingBuffer:
+    '''
+    Fixed number of time buckets of `bucket_width`, reused in a ring as time moves forward.
+
+    Each slot remembers which bucket it currently holds, so stale slots are reset lazily on
+    write and skipped on read. Writes are O(1) and reads are O(size) no matter how much
+    history has been recorded.
+    '''
+    def __init__(self, bucket_width: timedelta, size: int) -> None:
+        self.bucket_width = bucket_width
+        self.size = size
+        self._bucket_ids = [-1] * size
+        self._newest_bucket = -1
+        self._revenue = [0.0] * size
+        self._completed_jobs = [0] * size
+        self._busy_seconds = [0.0] * size
+
+    def __bucket_id__(self, ts: datetime) -> int:
+        return int(ts.timestamp() // self.bucket_width.total_seconds())
+
+    def __slot__(self, bucket_id: int) -> int:
+        slot = bucket_id % self.size
+        if self._bucket_ids[slot] != bucket_id:
+            self._newest_bucket = max(self._newest_bucket, bucket_id)
+            self._bucket_ids[slot] = bucket_id
+            self._revenue[slot] = 0.0
+            self._completed_jobs[slot] = 0
+            self._busy_seconds[slot] = 0.0
+        return slot
+
+    def __is_expired__(self, bucket_id: int) -> bool:
+        # the ring only moves forward, so buckets older than the newest one it holds are dropped
+        return bucket_id <= self._newest_bucket - self.size
+
+    def record_completion(self, ts: datetime, revenue: float) -> None:
+        bucket_id = self.__bucket_id__(ts)
+        if self.__is_expired__(bucket_id):
+            return
+        slot = self.__slot__(bucket_id)
+        self._revenue[slot] += revenue
+        self._completed_jobs[slot] += 1
+
+    def record_busy(self, start: datetime, end: datetime) -> None:
+        '''
+        Spreads the rendering time between `start` and `end` over the buckets it overlaps.
+        '''
+        width = self.bucket_width.total_seconds()
+        start_seconds, end_seconds = start.timestamp(), end.timestamp()
+        # anything before the oldest bucket this ring could hold after the write is dropped
+        first_bucket = max(int(start_seconds // width), int(end_seconds // width) - self.size + 1)
+        for bucket_id in range(first_bucket, int(end_seconds // width) + 1):
+            if self.__is_expired__(bucket_id):
+                continue
+            overlap = min(end_seconds, (bucket_id + 1) * width) - max(start_seconds, bucket_id * width)
+            if overlap > 0:
+                self._busy_seconds[self.__slot__(bucket_id)] += overlap
+
+    def buckets(self, now: datetime) -> list[StatsBucket]:
+        '''
+        The `size` buckets ending with the one holding `now`, oldest first.
+        '''
+        width = self.bucket_width.total_seconds()
+        current_bucket = self.__bucket_id__(now)
+        buckets = []
+        for bucket_id in range(current_bucket - self.size + 1, current_bucket + 1):
+            slot = bucket_id % self.size
+            held = self._bucket_ids[slot] == bucket_id
+            buckets.append(StatsBucket(
+                start_ts=datetime.fromtimestamp(bucket_id * width, tz=now.tzinfo),
+                revenue=round(self._revenue[slot], 2) if held else 0.0,
+                completed_jobs=self._completed_jobs[slot] if held else 0,
+                utilization=round(min(self._busy_seconds[slot] / width, 1.0), 4) if held else 0.0,
+            ))
+        return buckets
+
+
+class UserStatsRecorder:
+    '''
+    Per-user revenue, completion and utilization history at every resolution in `STATS_RESOLUTIONS`.
+    '''
+    def __init__(self) -> None:
+        self.buffers = {
+            resolution: RingBuffer(bucket_width, size)
+            for resolution, (bucket_width, size) in STATS_RESOLUTIONS.items()
+        }
+
+    def record_job(self, job: JobInfoQueued) -> None:
+        completed_ts = job.estimated_completion_ts
+        render_start_ts = completed_ts - timedelta(seconds=job.render_time_seconds)
+        for buffer in self.buffers.values():
+            buffer.record_completion(completed_ts, job.payout)
+            buffer.record_busy(render_start_ts, completed_ts)
+
+    def series(self, now: datetime, resolutions: list[StatsResolution] | None = None) -> list[StatsSeries]:
+        return [
+            StatsSeries(
+                resolution=resolution,
+                bucket_seconds=int(self.buffers[resolution].bucket_width.total_seconds()),
+                buckets=self.buffers[resolution].buckets(now),
+            ) for resolution in resolutions or self.buffers
+        ]
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import time
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+logger = logging.getLogger(__name__)
+
+# query parameters whose values say nothing about who sent them. everything else (job and
+# user IDs, username searches) is recorded by name only
+RECORDED_PARAM_VALUES = {'upgrade_type', 'levels', 'buy_max', 'start', 'items', 'resolution', 'leaderboard_size'}
+
+
+class TraceRecorderMiddleware:
+    '''
+    Appends one JSON line per HTTP request to `trace_file` for replaying with `benchmarks.replay`.
+
+    Each line holds the seconds since recording started, the method, the route template
+    (e.g. `/users/search/{user_id}`), the query parameters, the response status and the time
+    spent in the app. Tokens are replaced by `user-<n>` aliases in order of first appearance.
+    Query parameters map to the list of their values, since they can repeat, and only the ones
+    in `RECORDED_PARAM_VALUES` keep their values.
+
+    Lines are written as requests finish, so they aren't always in the order the requests
+    started in.
+    '''
+    def __init__(self, app: ASGIApp, trace_file: str) -> None:
+        self.app = app
+        self.trace_file = trace_file
+        self._trace = open(trace_file, 'a', buffering=1)
+        self._started = time.perf_counter()
+        self._user_aliases: dict[str, str] = {}
+        logger.info(f'Recording request trace to: {trace_file}')
+
+    def __user_alias__(self, authorization: str | None) -> str | None:
+        if not authorization:
+            return None
+        token_hash = hashlib.sha256(authorization.encode()).hexdigest()
+        if token_hash not in self._user_aliases:
+            self._user_aliases[token_hash] = f'user-{len(self._user_aliases) + 1}'
+        return self._user_aliases[token_hash]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        received = time.perf_counter()
+        response_status = 500
+
+        async def send_recorded(message: Message) -> None:
+            nonlocal response_status
+            if message['type'] == 'http.response.start':
+                response_status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_recorded)
+        finally:
+            # the router leaves the matched route in the scope, which gives the path template
+            route = scope.get('route')
+            params: dict[str, list[str | None]] = {}
+            for key, value in parse_qsl(scope.get('query_string', b'').decode()):
+                params.setdefault(key, []).append(value if key in RECORDED_PARAM_VALUES else None)
+            record = {
+                't': round(received - self._started, 6),
+                'method': scope['method'],
+                'route': getattr(route, 'path', None),
+                'user': self.__user_alias__(Headers(scope=scope).get('authorization')),
+                'params': params,
+                'status': response_status,
+                'duration_ms': round((time.perf_counter() - received) * 1000, 3),
+            }
+            self._trace.write(json.dumps(record) + '\n')
@@ -0,0 +1,444 @@
+import json
+import logging
+import zlib
+from collections.abc import Callable, Iterable, Iterator, MutableMapping
+from datetime import datetime
+from os import path, makedirs, remove
+from typing import Any
+
+from transcode_tycoon.models.users import UserInfo, LeaderboardUser
+from transcode_tycoon.utils.files import fsync_dir, write_json_atomic
+
+
+logger = logging.getLogger(__name__)
+
+
+class UserStore(MutableMapping[str, UserInfo]):
+    '''
+    Dict-like container of users that defers reading and validating persisted state.
+
+    Persisted users are held as raw JSON dicts until they are first accessed (or until
+    `materialize` gets to them), so the API can start serving before every user is validated.
+
+    When a `page_dir` is given, idle users can be paged out to one JSON file per user with
+    `evict`. Only a small leaderboard summary stays in memory, and the user is read back in
+    transparently the next time they're accessed.
+
+    Users held in memory are partitioned into `shard_count` shards by a stable hash of their
+    `user_id`. Code that changes a user marks them dirty with `mark_dirty`, so only dirty
+    shards need to be persisted, and only the users that changed need to be serialized again.
+    '''
+    def __init__(
+            self,
+            loader: Callable[[], dict[str, dict[str, Any]]] | None = None,
+            page_dir: str | None = None,
+            clock: Callable[[], datetime] = datetime.now,
+            shard_count: int = 1,
+        ) -> None:
+        self._loader = loader
+        self._loaded = loader is None
+        self.page_dir = page_dir
+        self.clock = clock
+        self.shard_count = shard_count
+        self._shards: list[set[str]] = [set() for _ in range(shard_count)]
+        self._dirty_shards: set[int] = set()
+        # encoded JSON of validated users that haven't changed since, reused by every dump
+        self._persisted: dict[str, bytes] = {}
+
+        self._resident: dict[str, UserInfo] = {}
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._cold: dict[str, LeaderboardUser] = {}
+        self._cold_index_dirty = False
+        # paged back in since the last dump. their page files go once their shard is persisted
+        self._stale_pages: set[str] = set()
+        self._last_access: dict[str, datetime] = {}
+        self._loaded_at = self.clock()
+
+    def load(self) -> None:
+        '''
+        Reads the persisted state without validating it. Safe to call more than once.
+        '''
+        if self._loaded:
+            return
+        raw_users = self._loader()
+        for user_id, user_data in raw_users.items():
+            if user_id not in self._resident:
+                self._pending[user_id] = user_data
+                self._shards[self.shard_of(user_id)].add(user_id)
+        self.__load_cold_index__()
+        self._loaded_at = self.clock()
+        self._loaded = True
+        logger.info(f'Read {len(self._pending)} users from persisted state, {len(self._cold)} paged out')
+
+    @property
+    def pending_count(self) -> int:
+        self.load()
+        return len(self._pending)
+
+    @property
+    def cold_count(self) -> int:
+        self.load()
+        return len(self._cold)
+
+    @property
+    def resident_count(self) -> int:
+        self.load()
+        return len(self._resident)
+
+    def materialize(self, limit: int | None = None) -> int:
+        '''
+        Validates up to `limit` pending users (all of them if `None`) and returns how many remain.
+        '''
+        self.load()
+        for user_id in list(self._pending)[:limit]:
+            self.__validate_pending__(user_id)
+        return len(self._pending)
+
+    def is_resident(self, user_id: str) -> bool:
+        '''
+        Whether the user is held in memory, validated or not.
+        '''
+        self.load()
+        return user_id in self._resident or user_id in self._pending
+
+    def resident_users(self) -> list[UserInfo]:
+        '''
+        Every validated user held in memory. Pending users are only validated when they have
+        queued jobs that may need settling, the rest are left to `pending_summaries`. Paged out
+        users are not read back in.
+        '''
+        self.load()
+        for user_id in [user_id for user_id, user_data in self._pending.items() if user_data['job_queue']]:
+            self.__validate_pending__(user_id)
+        return list(self._resident.values())
+
+    def pending_summaries(self) -> list[LeaderboardUser]:
+        '''
+        Leaderboard summaries of the pending users, read from their raw dicts without validating them.
+        '''
+        self.load()
+        return [self.__summarize__(user_id, user_data) for user_id, user_data in self._pending.items()]
+
+    def usernames(self) -> Iterator[tuple[str, str | None]]:
+        '''
+        `(user_id, username)` for every user, without validating or paging anyone in.
+        '''
+        self.load()
+        for user_id, user_info in self._resident.items():
+            yield user_id, user_info.username
+        for user_id, user_data in self._pending.items():
+            yield user_id, user_data.get('username')
+        for user_id, summary in self._cold.items():
+            yield user_id, summary.username
+
+    def peek(self, user_id: str) -> UserInfo | LeaderboardUser:
+        '''
+        Looks a user up without counting it as an access. Paged out users return their summary.
+        '''
+        self.load()
+        if user_id in self._cold:
+            return self._cold[user_id].model_copy()
+        if user_id in self._pending:
+            return self.__validate_pending__(user_id)
+        return self._resident[user_id]
+
+    def cold_summaries(self) -> list[LeaderboardUser]:
+        self.load()
+        return [summary.model_copy() for summary in self._cold.values()]
+
+    def shard_of(self, user_id: str) -> int:
+        # crc32 rather than hash() so shard assignment is stable across processes
+        return zlib.crc32(user_id.encode()) % self.shard_count
+
+    def mark_dirty(self, user_id: str) -> None:
+        self._dirty_shards.add(self.shard_of(user_id))
+        self._persisted.pop(user_id, None)
+
+    def mark_all_dirty(self) -> None:
+        self._dirty_shards.update(range(self.shard_count))
+
+    def mark_unsaved(self, shards: Iterable[int], cold_index: dict[str, dict[str, Any]] | None, stale_pages: list[str]) -> None:
+        '''
+        Hands back what a failed write took from `dump_dirty_shards`, `dump_cold_index` and
+        `take_stale_pages`, so the next dump writes it again.
+        '''
+        self._dirty_shards.update(shards)
+        if cold_index is not None:
+            self._cold_index_dirty = True
+        # users paged out again since don't need their page file removed any more
+        self._stale_pages.update(user_id for user_id in stale_pages if user_id not in self._cold)
+
+    def __persisted__(self, user_id: str) -> bytes | dict[str, Any]:
+        if user_id in self._pending:
+            # never changed in memory, so the dict is safe to encode from another thread
+            return self._pending[user_id]
+        if user_id not in self._persisted:
+            self._persisted[user_id] = self._resident[user_id].model_dump_json().encode()
+        return self._persisted[user_id]
+
+    def dump_dirty_shards(self) -> dict[int, dict[str, bytes | dict[str, Any]]]:
+        '''
+        Every dirty shard, keyed by shard number, for `encode_snapshot`. Users are given as
+        encoded JSON, and only the ones marked dirty since the last dump are serialized again.
+        Pending users are passed through as their raw dicts. Clears the dirty flags, so pass the
+        shards to `mark_unsaved` if writing them fails.
+
+        Save the cold index once the shards are written, so a user paged back in is never
+        missing from both.
+        '''
+        self.load()
+        shard_dump = {}
+        for shard in sorted(self._dirty_shards):
+            shard_dump[shard] = {user_id: self.__persisted__(user_id) for user_id in self._shards[shard]}
+        self._dirty_shards.clear()
+        return shard_dump
+
+    def dump(self) -> dict[str, dict[str, Any]]:
+        '''
+        JSON-ready copy of every user held in memory. Pending users are passed through without
+        being validated. Paged out users already live in their own files and are not included.
+        '''
+        self.load()
+        user_dump = {k: v.model_dump(mode='json') for k, v in self._resident.items()}
+        user_dump.update(self._pending)
+        self.save_cold_index()
+        return user_dump
+
+    def __validate_pending__(self, user_id: str) -> UserInfo:
+        user_data = self._pending.pop(user_id)
+        user_info = UserInfo.model_validate(user_data)
+        # encoded now while the raw dict is at hand, so dumps never serialize an unchanged user
+        self._persisted[user_id] = json.dumps(user_data).encode()
+        self._resident[user_id] = user_info
+        return user_info
+
+    ### PAGING ###
+    def __page_file__(self, user_id: str) -> str:
+        return path.join(self.page_dir, f'{user_id}.json')
+
+    def __cold_index_file__(self) -> str:
+        return path.join(self.page_dir, 'index.json')
+
+    def __load_cold_index__(self) -> None:
+        if self.page_dir is None or not path.exists(self.__cold_index_file__()):
+            return
+        with open(self.__cold_index_file__(), 'r') as json_file:
+            for user_id, summary in json.load(json_file).items():
+                # a user in the main state was paged back in after the index was last written
+                if user_id not in self._pending and user_id not in self._resident:
+                    self._cold[user_id] = LeaderboardUser.model_validate(summary)
+
+    def dump_cold_index(self) -> dict[str, dict[str, Any]] | None:
+        '''
+        JSON-ready copy of the cold index if it changed since it was last dumped, otherwise `None`.
+        Pass it to `mark_unsaved` if writing it fails.
+        '''
+        if self.page_dir is None or not self._cold_index_dirty:
+            return None
+        self._cold_index_dirty = False
+        return {k: v.model_dump(mode='json') for k, v in self._cold.items()}
+
+    def write_cold_index(self, cold_index: dict[str, dict[str, Any]] | None) -> None:
+        '''
+        Writes a cold index from `dump_cold_index`. Only touches the disk, so it's safe to call
+        from a worker thread.
+        '''
+        if cold_index is None:
+            return
+        makedirs(self.page_dir, exist_ok=True)
+        write_json_atomic(self.__cold_index_file__(), cold_index)
+
+    def save_cold_index(self) -> None:
+        cold_index = self.dump_cold_index()
+        try:
+            self.write_cold_index(cold_index)
+        except Exception:
+            self.mark_unsaved((), cold_index, [])
+            raise
+
+    def __summarize__(self, user_id: str, user_data: dict[str, Any]) -> LeaderboardUser:
+        return LeaderboardUser(
+            user_id=user_id,
+            username=user_data.get('username'),
+            completed_jobs=len(user_data['completed_jobs']),
+            processing_power=user_data['computer']['processing_power'],
+            funds=user_data['funds'],
+            total_revenue=user_data['total_revenue'],
+        )
+
+    def __page_out__(self, user_id: str, user_data: dict[str, Any]) -> None:
+        self._stale_pages.discard(user_id)
+        self._shards[self.shard_of(user_id)].discard(user_id)
+        self.mark_dirty(user_id)
+        self._cold[user_id] = self.__summarize__(user_id, user_data)
+
+    def cold_user_ids(self) -> list[str]:
+        self.load()
+        return list(self._cold)
+
+    def read_page(self, user_id: str) -> dict[str, Any] | None:
+        '''
+        Raw JSON of a paged out user, without paging them in. `None` if the page file is gone.
+        '''
+        try:
+            with open(self.__page_file__(user_id), 'r') as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return None
+
+    def __page_in__(self, user_id: str) -> UserInfo:
+        with open(self.__page_file__(user_id), 'rb') as json_file:
+            user_json = json_file.read()
+        user_info = UserInfo.model_validate(json.loads(user_json))
+        # the page file is still the only persisted copy of this user until their shard is
+        # dumped again. `remove_stale_pages` deletes it after that
+        self._stale_pages.add(user_id)
+        del self._cold[user_id]
+        self._cold_index_dirty = True
+        self._resident[user_id] = user_info
+        self._shards[self.shard_of(user_id)].add(user_id)
+        self.mark_dirty(user_id)
+        self._persisted[user_id] = user_json
+        logger.info(f'Paged user {user_id} back in')
+        return user_info
+
+    def take_stale_pages(self) -> list[str]:
+        '''
+        Users whose page files are outdated because they were paged back in. Call this right
+        before `dump_dirty_shards`, and pass the result to `remove_stale_pages` once the dumped
+        shards are on disk.
+        '''
+        stale_pages = list(self._stale_pages)
+        self._stale_pages.clear()
+        return stale_pages
+
+    def remove_stale_pages(self, user_ids: list[str]) -> None:
+        for user_id in user_ids:
+            # paged out again since, or paged back in after that and not persisted yet
+            if user_id in self._cold or user_id in self._stale_pages:
+                continue
+            try:
+                remove(self.__page_file__(user_id))
+            except FileNotFoundError:
+                pass
+
+    def __is_idle__(self, user_id: str, idle_cutoff: datetime) -> bool:
+        if user_id in self._resident:
+            return self._last_access.get(user_id, self._loaded_at) < idle_cutoff and not self._resident[user_id].job_queue
+        if user_id in self._pending:
+            return self._loaded_at < idle_cutoff and not self._pending[user_id]['job_queue']
+        return False
+
+    def idle_users(self, idle_cutoff: datetime) -> dict[str, dict[str, Any]]:
+        '''
+        JSON-ready copy of every user that `evict` would page out.
+
+        Users with queued jobs stay resident so that their leaderboard summary can't go stale.
+        '''
+        self.load()
+        if self.page_dir is None:
+            return {}
+        idle_users = {
+            user_id: user_info.model_dump(mode='json') for user_id, user_info in self._resident.items()
+            if self.__is_idle__(user_id, idle_cutoff)
+        }
+        idle_users.update(
+            (user_id, user_data) for user_id, user_data in self._pending.items()
+            if self.__is_idle__(user_id, idle_cutoff)
+        )
+        return idle_users
+
+    def write_pages(self, idle_users: dict[str, dict[str, Any]]) -> None:
+        '''
+        Writes a page file for each user from `idle_users`, flushing the directory once for the
+        whole batch. Only touches the disk, so it's safe to call from a worker thread.
+        '''
+        if not idle_users:
+            return
+        makedirs(self.page_dir, exist_ok=True)
+        for user_id, user_data in idle_users.items():
+            write_json_atomic(self.__page_file__(user_id), user_data, sync_dir=False)
+        fsync_dir(self.page_dir)
+
+    def page_out(self, idle_users: dict[str, dict[str, Any]], idle_cutoff: datetime) -> int:
+        '''
+        Drops the users from `idle_users` from memory once their page files are written. Users
+        accessed since `idle_users` was called stay resident. Returns the number paged out.
+        '''
+        evicted = 0
+        for user_id, user_data in idle_users.items():
+            if not self.__is_idle__(user_id, idle_cutoff):
+                # the page file went stale before it was used
+                self._stale_pages.add(user_id)
+                continue
+            self.__page_out__(user_id, user_data)
+            self._resident.pop(user_id, None)
+            self._pending.pop(user_id, None)
+            self._last_access.pop(user_id, None)
+            evicted += 1
+        if evicted:
+            self._cold_index_dirty = True
+            logger.info(f'Paged out {evicted} idle users to: {self.page_dir}')
+        return evicted
+
+    def evict(self, idle_cutoff: datetime) -> int:
+        '''
+        Pages out every user with an empty job queue whose last access was before `idle_cutoff`
+        and saves the cold index. Returns the number of evicted users.
+        '''
+        idle_users = self.idle_users(idle_cutoff)
+        self.write_pages(idle_users)
+        evicted = self.page_out(idle_users, idle_cutoff)
+        self.save_cold_index()
+        return evicted
+
+    ### MAPPING INTERFACE ###
+    def __getitem__(self, user_id: str) -> UserInfo:
+        self.load()
+        self._last_access[user_id] = self.clock()
+        if user_id in self._resident:
+            return self._resident[user_id]
+        if user_id in self._pending:
+            return self.__validate_pending__(user_id)
+        if user_id in self._cold:
+            return self.__page_in__(user_id)
+        self._last_access.pop(user_id)
+        raise KeyError(user_id)
+
+    def __setitem__(self, user_id: str, user_info: UserInfo) -> None:
+        self.load()
+        self._pending.pop(user_id, None)
+        if self._cold.pop(user_id, None) is not None:
+            self._cold_index_dirty = True
+        self._resident[user_id] = user_info
+        self._shards[self.shard_of(user_id)].add(user_id)
+        self.mark_dirty(user_id)
+        self._last_access[user_id] = self.clock()
+
+    def __delitem__(self, user_id: str) -> None:
+        self.load()
+        self._last_access.pop(user_id, None)
+        self._shards[self.shard_of(user_id)].discard(user_id)
+        self.mark_dirty(user_id)
+        if user_id in self._resident:
+            del self._resident[user_id]
+        elif user_id in self._cold:
+            del self._cold[user_id]
+            self._cold_index_dirty = True
+            remove(self.__page_file__(user_id))
+        else:
+            del self._pending[user_id]
+
+    def __contains__(self, user_id: object) -> bool:
+        self.load()
+        return user_id in self._resident or user_id in self._pending or user_id in self._cold
+
+    def __iter__(self) -> Iterator[str]:
+        self.load()
+        yield from list(self._resident)
+        yield from list(self._pending)
+        yield from list(self._cold)
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._resident) + len(self._pending) + len(self._cold)
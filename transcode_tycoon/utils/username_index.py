@@ -0,0 +1,41 @@
+from bisect import bisect_left, insort
+from collections.abc import Iterable
+
+
+class UsernameIndex:
+    '''
+    Case-insensitive username index kept as a sorted list of `(username, user_id)` pairs.
+
+    Prefix searches are two binary searches plus a slice, so lookups are O(log n + k).
+    '''
+    def __init__(self, usernames: Iterable[tuple[str, str | None]] = ()) -> None:
+        self._user_keys: dict[str, str] = {}
+        for user_id, username in usernames:
+            if username:
+                self._user_keys[user_id] = username.lower()
+        self._entries: list[tuple[str, str]] = sorted((v, k) for k, v in self._user_keys.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, user_id: str, username: str | None) -> None:
+        self.remove(user_id)
+        if username:
+            self._user_keys[user_id] = username.lower()
+            insort(self._entries, (username.lower(), user_id))
+
+    def remove(self, user_id: str) -> None:
+        key = self._user_keys.pop(user_id, None)
+        if key is not None:
+            del self._entries[bisect_left(self._entries, (key, user_id))]
+
+    def search(self, prefix: str, start: int = 0, items: int = 10) -> tuple[int, list[str]]:
+        '''
+        Returns the total number of usernames starting with `prefix` and the user IDs
+        for one page of them, in alphabetical order.
+        '''
+        prefix = prefix.lower()
+        low = bisect_left(self._entries, (prefix,))
+        high = bisect_left(self._entries, (prefix + '\U0010ffff',))
+        page = self._entries[min(low + start, high):min(low + start + items, high)]
+        return high - low, [user_id for _, user_id in page]